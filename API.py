@@ -1,43 +1,731 @@
-from fastapi import FastAPI
-import psycopg2
+import io
 import os
-from datetime import datetime
+import zlib
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import FastAPI, Request, Response, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+import anyio
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+from database import warm_pool, close_pool, db_connection, run_db, PoolTimeout
+from ingest_buffer import IngestBuffer, BufferFull
+from partitions import ensure_partitions, create_future_partitions, retention_cutoff
+from retention import apply_retention
+from archive import read_archive, archive_summary
+from readings import parse_bucket, choose_bucket, query_buckets, export_chunks
+from rollups import rollup_ctes
+from migrations import current_version, migrate, LATEST_VERSION
+from latest_cache import create_latest_cache, load_latest
+from live_feed import LiveHub, HubFull
+from alerts import (AlertEngine, load_rules, post_webhook, ALERT_TICK_S, ALERT_MAX_PENDING, ALERT_WEBHOOK_URL,
+                    ALERT_SEND_TIMEOUT_S)
+import reading_codec
+import metrics
+from metrics import MetricsMiddleware, DB_SECONDS, ROWS_INGESTED, ERRORS
+
+# Voor de cold-start metingen: tijd sinds het laden van de API
+_BOOT = time.monotonic()
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware, probe_routes=("/ready",))
+
+# Maximaal aantal metingen per batch request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+# Maximale grootte van een (uitgepakte) batch body
+MAX_BATCH_BYTES = int(os.environ.get('MAX_BATCH_BYTES', str(5 * 1024 * 1024)))
+
+# Write-behind buffer voor /log_data: groepeer losse metingen in een commit
+INGEST_FLUSH_MS = int(os.environ.get('INGEST_FLUSH_MS', '200'))
+INGEST_FLUSH_ROWS = int(os.environ.get('INGEST_FLUSH_ROWS', '500'))
+INGEST_MAX_QUEUE = int(os.environ.get('INGEST_MAX_QUEUE', '50000'))
+INGEST_ACK_WAIT_MS = int(os.environ.get('INGEST_ACK_WAIT_MS', '0'))    # 0 = direct antwoorden
+
+# Schema hoort bij de deploy gemigreerd te worden (python migrations.py).
+# Staat dit aan, dan voert de API openstaande migraties bij het starten zelf uit.
+MIGRATE_ON_START = os.environ.get('MIGRATE_ON_START', '1') == '1'
+
+# Hoe vaak partities vooruit aangemaakt en verlopen dagen opgeruimd worden
+# (retentie: SENSOR_RETENTION_DAYS en ARCHIVE_DIR, zie retention.py)
+PARTITION_MAINTENANCE_S = int(os.environ.get('PARTITION_MAINTENANCE_S', '3600'))
+
+# Aantal punten per /readings antwoord (standaard en hard maximum)
+READINGS_DEFAULT_POINTS = int(os.environ.get('READINGS_DEFAULT_POINTS', '500'))
+READINGS_MAX_POINTS = int(os.environ.get('READINGS_MAX_POINTS', '5000'))
+
+# Export: rijen per stuk en hoe lang de export-query mag duren
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '5000'))
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.environ.get('EXPORT_STATEMENT_TIMEOUT_MS', '300000'))
+
+# Live feed (Server-Sent Events): limieten en heartbeat
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', '200'))
+LIVE_MAX_PENDING = int(os.environ.get('LIVE_MAX_PENDING', '100'))      # berichten per trage client
+LIVE_MAX_DROPS = int(os.environ.get('LIVE_MAX_DROPS', '500'))          # daarna wordt hij afgekapt
+LIVE_HEARTBEAT_S = float(os.environ.get('LIVE_HEARTBEAT_S', '15'))
+
+# Tijd op het apparaat: hoogstens zoveel sec in de toekomst (klokverschil) en niet
+# voor deze datum. Een Pi met een verkeerde klok blijft anders in /latest hangen.
+TIMESTAMP_MAX_SKEW_S = int(os.environ.get('TIMESTAMP_MAX_SKEW_S', '300'))
+TIMESTAMP_MIN = datetime.fromisoformat(os.environ.get('TIMESTAMP_MIN', '2020-01-01'))
+
+# Toegestane tekens voor device_id / plant_id (ook veilig binnen COPY)
+ID_PATTERN = r"^[A-Za-z0-9_.:-]{1,64}$"
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class Reading(BaseModel):
+    """Een meting zoals een apparaat hem (gebufferd) instuurt."""
+    timestamp: Optional[datetime] = None    # tijd op het apparaat; leeg = tijd van ontvangst
+    device_id: str = Field("default", pattern=ID_PATTERN)
+    plant_id: Optional[str] = Field(None, pattern=ID_PATTERN)
+    licht: Optional[float] = Field(None, allow_inf_nan=False)    # leeg = geen lichtsensor
+    bodemvocht: float = Field(allow_inf_nan=False)
+    water_gegeven: bool = False
+    # Volgnummer van het apparaat: een herhaalde meting met dezelfde
+    # (device_id, seq, timestamp) wordt stil overgeslagen
+    seq: Optional[int] = Field(None, ge=0, le=2**63 - 1)
 
-# Haal de database URL op uit de Render instellingen
-DATABASE_URL = os.environ.get('DATABASE_URL')
+    @model_validator(mode="after")
+    def _seq_needs_timestamp(self):
+        # Zonder eigen tijd krijgt een herhaling een andere ontvangsttijd en is hij niet te herkennen
+        if self.seq is not None and self.timestamp is None:
+            raise ValueError("seq vereist een timestamp van het apparaat")
+        return self
+
+    @model_validator(mode="after")
+    def _timestamp_in_range(self):
+        if self.timestamp is not None:
+            _check_timestamp(_local_naive(self.timestamp))
+        return self
+
+
+def _check_timestamp(ts):
+    """ValueError als een meting met deze (lokale, naive) tijd niet opgeslagen mag worden."""
+    if ts < TIMESTAMP_MIN:
+        raise ValueError(f"timestamp ligt voor {TIMESTAMP_MIN.date().isoformat()}")
+    if ts > datetime.now() + timedelta(seconds=TIMESTAMP_MAX_SKEW_S):
+        raise ValueError(f"timestamp ligt meer dan {TIMESTAMP_MAX_SKEW_S}s in de toekomst")
+    cutoff = retention_cutoff()
+    # Een dag die de retentie al weggooide, niet opnieuw laten ontstaan (bv. een
+    # Pi die na lang offline zijn spool naspeelt): de rollups van die dag blijven zoals ze zijn
+    if cutoff is not None and ts.date() < cutoff:
+        raise ValueError(f"timestamp ligt voor de retentiegrens ({cutoff.isoformat()})")
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
 
 @app.on_event("startup")
-def setup_db():
-    # Maakt de tabel aan als deze nog niet bestaat
-    conn = get_db_connection()
-    cur = conn.cursor()
+async def start_background_tasks():
+    # Niet wachten op de database: de server neemt meteen verbindingen aan,
+    # opwarmen gebeurt op de achtergrond en /ready meldt wanneer het klaar is
+    ingest_buffer.start()
+    alert_engine.start()
+    background_tasks.append(asyncio.create_task(_warm_up()))
+    background_tasks.append(asyncio.create_task(_partition_maintenance_loop()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    # Eerst de buffer leegschrijven, daarna pas de pool dicht
+    await ingest_buffer.close()
+    await alert_engine.close()
+    await latest_cache.close()
+
+
+@app.on_event("shutdown")
+def close_db():
+    close_pool()
+
+
+@app.exception_handler(PoolTimeout)
+@app.exception_handler(BufferFull)
+@app.exception_handler(HubFull)
+async def overload_handler(request: Request, exc: Exception):
+    # Database is overbelast: laat de client het later opnieuw proberen
+    return JSONResponse(status_code=503, content={"status": "error", "detail": str(exc)})
+
+
+def _prepare_db():
+    """Pool openen en vullen, schema controleren, partities en cache klaarzetten."""
+    warm_pool(prepare=_prepare_connection)
+    with db_connection() as conn:
+        version = current_version(conn)
+        if version < LATEST_VERSION:
+            if not MIGRATE_ON_START:
+                raise RuntimeError(f"schema versie {version}, verwacht {LATEST_VERSION} (draai python migrations.py)")
+            print(f"Schema versie {version} loopt achter, migraties worden nu uitgevoerd")
+            migrate(conn)
+            version = LATEST_VERSION
+        # Partities voor vandaag en de komende dagen: de eerste insert hoeft geen DDL te doen
+        create_future_partitions(conn)
+        # Cache met laatste waarden vullen, zodat /latest na een herstart meteen klopt
+        latest = load_latest(conn)
+        conn.rollback()
+    return version, latest
+
+
+async def _warm_up():
+    delay = 1
+    while True:
+        try:
+            version, latest = await run_db(_prepare_db)
+            break
+        except Exception as e:
+            warmup["error"] = str(e)
+            print(f"Opwarmen mislukt, opnieuw over {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    await latest_cache.update(latest)
+    warmup.update(
+        ready=True,
+        error=None,
+        schema_version=version,
+        ready_s=round(time.monotonic() - _BOOT, 3),
+    )
+    print(f"API klaar na {warmup['ready_s']}s (schema versie {version})")
+
+
+def _maintain_partitions():
+    # Partities vooruit aanmaken, daarna verlopen dagen downsamplen, archiveren en weggooien
+    with db_connection() as conn:
+        create_future_partitions(conn)
+        apply_retention(conn)
+
+
+async def _partition_maintenance_loop():
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_S)
+        try:
+            await run_db(_maintain_partitions)
+        except Exception as e:
+            print(f"Partitie-onderhoud mislukt: {e}")
+
+
+def _local_naive(ts):
+    # De kolom is TIMESTAMP zonder tijdzone, net als datetime.now() hieronder
+    if ts.tzinfo is not None:
+        return ts.astimezone().replace(tzinfo=None)
+    return ts
+
+
+INSERT_FROM_STAGING = f'''
+    WITH ins AS (
+        INSERT INTO sensor_data (timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven, seq)
+        SELECT timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven, seq FROM ingest_staging
+        ON CONFLICT DO NOTHING
+        RETURNING timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven, seq
+    ),
+    seen AS (
+        INSERT INTO devices AS d (device_id, plant_id, first_seen, last_seen)
+        SELECT device_id, max(plant_id), min(timestamp), max(timestamp)
+        FROM ins
+        GROUP BY device_id
+        ON CONFLICT (device_id) DO UPDATE SET
+            plant_id = COALESCE(EXCLUDED.plant_id, d.plant_id),
+            first_seen = LEAST(d.first_seen, EXCLUDED.first_seen),
+            last_seen = GREATEST(d.last_seen, EXCLUDED.last_seen)
+    ),
+    {rollup_ctes("ins")}
+    SELECT timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven, seq FROM ins
+'''
+
+
+def _prepare_connection(cur):
+    # Tijdelijke tabel per verbinding; bestaat hij al (opgewarmd), dan kost dit bijna niets
     cur.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_data (
-            id SERIAL PRIMARY KEY,
+        CREATE TEMP TABLE IF NOT EXISTS ingest_staging (
             timestamp TIMESTAMP,
+            device_id TEXT,
+            plant_id TEXT,
             licht FLOAT,
             bodemvocht FLOAT,
-            water_gegeven BOOLEAN
-        );
+            water_gegeven BOOLEAN,
+            seq BIGINT
+        ) ON COMMIT DELETE ROWS
     ''')
-    conn.commit()
-    cur.close()
-    conn.close()
+
+
+def _insert_readings(readings):
+    """
+    Schrijft een hele batch weg in een transactie: COPY naar een tijdelijke
+    tabel, daarna een statement dat sensor_data en de rollups bijwerkt.
+    Geeft de weggeschreven rijen terug (als dicts); dubbele metingen
+    (zelfde device_id, seq en timestamp) zitten daar niet bij.
+    """
+    now = datetime.now()
+    buf = io.StringIO()
+    days = set()
+    for r in readings:
+        ts = _local_naive(r.timestamp) if r.timestamp else now
+        days.add(ts.date())
+        plant = r.plant_id or "\\N"   # \N = NULL in COPY
+        seq = "\\N" if r.seq is None else r.seq
+        licht = "\\N" if r.licht is None else repr(r.licht)
+        buf.write(
+            f"{ts.isoformat(sep=' ')}\t{r.device_id}\t{plant}\t"
+            f"{licht}\t{r.bodemvocht!r}\t{'t' if r.water_gegeven else 'f'}\t{seq}\n"
+        )
+    buf.seek(0)
+
+    with db_connection() as conn:
+        ensure_partitions(conn, days)
+        cur = conn.cursor()
+        _prepare_connection(cur)
+        with DB_SECONDS.time("copy"):
+            cur.copy_expert(
+                "COPY ingest_staging (timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven, seq) FROM STDIN",
+                buf
+            )
+        with DB_SECONDS.time("insert"):
+            cur.execute(INSERT_FROM_STAGING)
+            cols = [c.name for c in cur.description]
+            rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+        with DB_SECONDS.time("commit"):
+            conn.commit()
+        cur.close()
+    return rows
+
+
+def _query_readings(start, end, bucket_s, max_points, device):
+    with db_connection() as conn:
+        result = query_buckets(conn, start, end, bucket_s, max_points, device)
+        conn.rollback()     # alleen gelezen; transactie netjes afsluiten
+    return result
+
+
+def _list_devices():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT device_id, plant_id, first_seen, last_seen FROM devices ORDER BY device_id")
+        rows = cur.fetchall()
+        cur.close()
+        conn.rollback()
+    return [
+        {"device_id": d, "plant_id": p, "first_seen": first, "last_seen": last}
+        for d, p, first, last in rows
+    ]
+
+
+class _ExportStream:
+    """
+    Export-chunks met hun eigen poolverbinding. close() geeft de verbinding
+    precies een keer terug, ook als de stream nooit gestart is; de lock
+    voorkomt dat dat gebeurt terwijl een thread nog een chunk ophaalt.
+    """
+
+    def __init__(self, conn_cm, conn, chunks):
+        self._conn_cm = conn_cm
+        self._conn = conn
+        self._chunks = chunks
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __iter__(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                chunk = next(self._chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._chunks.close()
+                self._conn.rollback()
+            finally:
+                self._conn_cm.__exit__(None, None, None)
+
+
+class _ExportResponse(StreamingResponse):
+    """Geeft de verbinding van de export altijd terug, ook als de client al weg is voor de eerste chunk."""
+
+    def __init__(self, stream, **kwargs):
+        super().__init__(stream, **kwargs)
+        self._stream = stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self._stream.close)
+
+
+def _open_export(start, end, device, fmt, gzip):
+    """
+    Leent de verbinding al voor het antwoord begint, zodat een volle pool
+    nog een nette 503 geeft in plaats van een afgebroken download.
+    """
+    conn_cm = db_connection()
+    conn = conn_cm.__enter__()
+    try:
+        chunks = export_chunks(
+            conn, start, end, device, fmt, gzip,
+            chunk_rows=EXPORT_CHUNK_ROWS,
+            statement_timeout_ms=EXPORT_STATEMENT_TIMEOUT_MS,
+            # Dagen die al uit sensor_data zijn, komen uit het archief
+            archived=read_archive(start, end, device, chunk_rows=EXPORT_CHUNK_ROWS),
+        )
+    except BaseException:
+        conn_cm.__exit__(None, None, None)
+        raise
+    return _ExportStream(conn_cm, conn, chunks)
+
+
+async def _after_ingest(rows):
+    """Loopt na elke gecommitte insert (buffer of batch) met de nieuwe rijen."""
+    per_device = {}
+    for row in rows:
+        per_device[row["device_id"]] = per_device.get(row["device_id"], 0) + 1
+    for device, n in per_device.items():
+        ROWS_INGESTED.inc(device, amount=n)
+
+    try:
+        await latest_cache.update(rows)
+    except Exception as e:
+        # Bv. Redis weg: live en alerts moeten deze rijen toch krijgen
+        ERRORS.inc("latest_cache")
+        print(f"Latest cache bijwerken mislukt: {e}")
+    live_hub.publish(rows)
+    alert_engine.feed(rows)
+
+    if rows and warmup["first_insert_s"] is None:
+        warmup["first_insert_s"] = round(time.monotonic() - _BOOT, 3)
+        print(f"Eerste meting weggeschreven na {warmup['first_insert_s']}s")
+
+
+background_tasks = []
+# Opstartstatus voor /ready en de cold-start metrics
+warmup = {
+    "ready": False,
+    "schema_version": None,
+    "ready_s": None,            # sec tot pool, schema en cache klaar waren
+    "first_insert_s": None,     # sec tot de eerste gelukte insert
+    "error": None,
+}
+latest_cache = create_latest_cache()
+live_hub = LiveHub(
+    max_subscribers=LIVE_MAX_SUBSCRIBERS,
+    max_pending=LIVE_MAX_PENDING,
+    max_drops=LIVE_MAX_DROPS,
+)
+
+
+async def _on_alert(alert):
+    # Meldingen gaan als 'event: alert' over /live en optioneel naar een webhook
+    live_hub.publish_alert(alert)
+    if ALERT_WEBHOOK_URL:
+        try:
+            await run_in_threadpool(post_webhook, ALERT_WEBHOOK_URL, alert)
+        except OSError as e:
+            ERRORS.inc("alert_webhook")
+            print(f"Alert webhook mislukt: {e}")
+
+
+alert_engine = AlertEngine(load_rules(), _on_alert, tick_s=ALERT_TICK_S, max_pending=ALERT_MAX_PENDING,
+                           send_timeout_s=ALERT_SEND_TIMEOUT_S)
+
+metrics.Gauge("smartworld_ingest_queue_depth", "Metingen in de schrijfbuffer", lambda: ingest_buffer.depth)
+metrics.Gauge("smartworld_live_subscribers", "Open live-verbindingen", lambda: live_hub.subscriber_count)
+metrics.Gauge("smartworld_startup_ready_seconds", "Tijd vanaf laden tot de API klaar was", lambda: warmup["ready_s"])
+metrics.Gauge("smartworld_startup_first_insert_seconds", "Tijd vanaf laden tot de eerste gelukte insert",
+              lambda: warmup["first_insert_s"])
+ingest_buffer = IngestBuffer(
+    _insert_readings,
+    flush_ms=INGEST_FLUSH_MS,
+    flush_rows=INGEST_FLUSH_ROWS,
+    max_rows=INGEST_MAX_QUEUE,
+    on_flushed=_after_ingest,
+)
+
+
+def _parse_batch(body, content_type):
+    """
+    Geeft (metingen, fouten) terug. Een kapotte regel of meting kost
+    alleen die ene meting, niet de hele batch.
+    """
+    errors = []
+    if content_type == reading_codec.CONTENT_TYPE:
+        try:
+            items = list(enumerate(reading_codec.decode_readings(body)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"ongeldig binair frame: {e}")
+    elif content_type in NDJSON_TYPES:
+        items = []
+        for i, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                items.append((i, json.loads(line)))
+            except ValueError as e:
+                errors.append({"index": i, "error": f"ongeldige JSON: {e}"})
+    else:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"ongeldige JSON: {e}")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="verwacht een JSON array met metingen")
+        items = list(enumerate(data))
+
+    if len(items) + len(errors) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"maximaal {MAX_BATCH_SIZE} metingen per batch")
+
+    readings = []
+    for i, item in items:
+        try:
+            readings.append(Reading.model_validate(item))
+        except ValidationError as e:
+            errors.append({"index": i, "error": e.errors(include_url=False)[0]["msg"]})
+    return readings, errors
+
 
 @app.post("/log_data")
-async def log_data(licht: float, bodemvocht: float, water_gegeven: bool):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO sensor_data (timestamp, licht, bodemvocht, water_gegeven) VALUES (%s, %s, %s, %s)",
-        (datetime.now(), licht, bodemvocht, water_gegeven)
+async def log_data(
+    bodemvocht: float,
+    water_gegeven: bool,
+    licht: Optional[float] = None,
+    device_id: str = Query("default", pattern=ID_PATTERN),
+    plant_id: Optional[str] = Query(None, pattern=ID_PATTERN),
+    seq: Optional[int] = Query(None, ge=0, le=2**63 - 1),
+    timestamp: Optional[datetime] = None,
+):
+    if seq is not None and timestamp is None:
+        raise HTTPException(status_code=400, detail="seq vereist een timestamp van het apparaat")
+    try:
+        reading = Reading(
+            timestamp=_local_naive(timestamp) if timestamp else datetime.now(),
+            device_id=device_id,
+            plant_id=plant_id,
+            licht=licht,
+            bodemvocht=bodemvocht,
+            water_gegeven=water_gegeven,
+            seq=seq,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False)[0]["msg"])
+    committed = ingest_buffer.add(reading, wait=INGEST_ACK_WAIT_MS > 0)
+
+    if committed is not None:
+        # Kort wachten op de groepscommit; duurt het langer, dan staat hij in de rij
+        try:
+            stored = await asyncio.wait_for(asyncio.shield(committed), INGEST_ACK_WAIT_MS / 1000)
+        except asyncio.TimeoutError:
+            return {"status": "queued"}
+        if not stored:
+            raise HTTPException(status_code=422, detail="meting kon niet weggeschreven worden")
+    return {"status": "success"}
+
+
+async def _read_body(request):
+    """Body van het request; met Content-Encoding: gzip wordt hij (begrensd) uitgepakt."""
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding != "gzip":
+        raise HTTPException(status_code=415, detail=f"Content-Encoding {encoding} wordt niet ondersteund")
+    decompressor = zlib.decompressobj(wbits=31)
+    try:
+        data = decompressor.decompress(body, MAX_BATCH_BYTES)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="ongeldige gzip body")
+    if decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail=f"uitgepakte body groter dan {MAX_BATCH_BYTES} bytes")
+    return data
+
+
+@app.post("/log_data/batch")
+async def log_data_batch(request: Request):
+    """
+    Neemt een JSON array, NDJSON of binair frame (reading_codec) met
+    metingen aan; het formaat volgt uit de Content-Type.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    readings, errors = _parse_batch(await _read_body(request), content_type)
+
+    inserted = []
+    if readings:
+        inserted = await run_db(_insert_readings, readings)
+        try:
+            await _after_ingest(inserted)
+        except Exception as e:
+            # De rijen staan al in de database: geen 500, anders stuurt de Pi ze opnieuw
+            ERRORS.inc("after_ingest")
+            print(f"Verwerken na batch insert mislukt: {e}")
+
+    if errors:
+        ERRORS.inc("rejected_reading", amount=len(errors))
+    errors.sort(key=lambda e: e["index"])
+    return {
+        "status": "success",
+        "accepted": len(readings),
+        "duplicates": len(readings) - len(inserted),
+        "rejected": len(errors),
+        "errors": errors[:20],
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 zodra pool, schema en cache klaar zijn, daarvoor 503."""
+    return JSONResponse(status_code=200 if warmup["ready"] else 503, content=warmup)
+
+
+@app.get("/ingest/stats")
+async def ingest_stats():
+    """Wachtrij-diepte en flush statistieken van de schrijfbuffer."""
+    return ingest_buffer.snapshot()
+
+
+@app.get("/readings")
+async def get_readings(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: Optional[str] = None,
+    device: Optional[str] = Query(None, pattern=ID_PATTERN),
+    max_points: int = Query(READINGS_DEFAULT_POINTS, ge=1, le=READINGS_MAX_POINTS),
+):
+    """
+    Geschiedenis voor grafieken: min/max/gem van licht en bodemvocht en het
+    aantal keer water geven per tijdsbucket. Standaard de laatste 24 uur,
+    van alle apparaten samen of van een apparaat (device).
+    """
+    end = _local_naive(end) if end else datetime.now()
+    start = _local_naive(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' moet voor 'to' liggen")
+    try:
+        requested = parse_bucket(bucket) if bucket else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    bucket_s = choose_bucket(start, end, max_points, requested)
+    source, points = await run_db(_query_readings, start, end, bucket_s, max_points, device)
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket_seconds": bucket_s,
+        "device": device,
+        "source": source,
+        "points": points,
+    }
+
+
+@app.get("/devices")
+async def get_devices():
+    """Alle apparaten die ooit metingen stuurden, met eerste/laatste meting."""
+    return await run_db(_list_devices)
+
+
+def _cached(request, etag, content):
+    # Dashboards die pollen krijgen een lege 304 als er niets veranderd is
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+@app.get("/latest")
+async def get_latest(request: Request):
+    """Laatste meting van elk apparaat, uit het geheugen (geen database)."""
+    etag, latest = await latest_cache.get_all()
+    return _cached(request, etag, latest)
+
+
+@app.get("/latest/{device}")
+async def get_latest_device(device: str, request: Request):
+    etag, reading = await latest_cache.get(device)
+    if reading is None:
+        raise HTTPException(status_code=404, detail=f"geen metingen van {device}")
+    return _cached(request, etag, reading)
+
+
+@app.get("/export")
+async def export(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    device: Optional[str] = Query(None, pattern=ID_PATTERN),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+):
+    """Ruwe metingen als CSV of NDJSON, gestreamd (optioneel gzip); ook gearchiveerde dagen."""
+    end = _local_naive(end) if end else datetime.now()
+    start = _local_naive(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' moet voor 'to' liggen")
+
+    stream = await run_db(_open_export, start, end, device, format, gzip)
+
+    filename = f"sensor_data_{start:%Y%m%d}_{end:%Y%m%d}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return _ExportResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/archive")
+async def get_archive():
+    """Gearchiveerde dagen (Parquet bestanden); terug te lezen via /export."""
+    return await run_in_threadpool(archive_summary)
+
+
+@app.get("/alerts")
+async def get_alerts(device: Optional[str] = Query(None, pattern=ID_PATTERN)):
+    """Recente meldingen van de alert engine (nieuwste eerst) en de regels."""
+    recent = [a for a in reversed(alert_engine.recent) if device is None or a["device_id"] == device]
+    return {**alert_engine.snapshot(), "alerts": recent}
+
+
+@app.get("/live")
+async def live(device: Optional[str] = Query(None, pattern=ID_PATTERN)):
+    """
+    Server-Sent Events: elke nieuwe meting (van alle apparaten of alleen
+    'device') wordt direct doorgestuurd. Dashboards hoeven niet te pollen.
+    """
+    sub = live_hub.subscribe(device)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.closed:
+                messages = await sub.drain(LIVE_HEARTBEAT_S)
+                # Alles wat klaarstaat in een keer; anders een heartbeat
+                yield "".join(messages) if messages else ": ping\n\n"
+        finally:
+            live_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"status": "success"}
\ No newline at end of file
+
+
+@app.get("/live/stats")
+async def live_stats():
+    return live_hub.snapshot()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus tekstformaat."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -4,10 +4,7 @@ import time
 import RPi.GPIO as GPIO
 import threading
 
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+from adc_sampler import ScanScheduler
 
 # ---------------------------------------------------------
 # GPIO / ULTRASONIC SENSOR (HC-SR04)
@@ -52,19 +49,28 @@ def afstand():
 # ---------------------------------------------------------
 # ADS1115 – MOISTURE SENSOR
 # ---------------------------------------------------------
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-ads.gain = 1  # ±4.096V (geschikt voor 3.3V)
+# De GUI en de automatische meting lezen uit verschillende threads. Alleen de
+# scan-thread komt aan de ADC (gedeelde bus, i2c_bus.py): vocht op A0 2x per
+# seconde, licht op A2 eens per 2 s. De rest leest de laatste meting.
+scan = ScanScheduler([
+    {"name": "bodemvocht", "pin": 0, "rate_hz": 2.0},
+    {"name": "licht", "pin": 2, "rate_hz": 0.5},
+])
+scan.start()
 
-moisture_channel = AnalogIn(ads,0)
-light_channel = AnalogIn(ads,2)
+
+def latest_raw(name):
+    sample = scan.latest(name, wait=1.0)
+    return sample["raw"] if sample else None
 
 # Kalibratiewaarden (AANPASSEN!)
 WET = 12000    # natte grond / water
 DRY = 26000    # droge lucht
 
 def read_moisture():
-    raw = moisture_channel.value
+    raw = latest_raw("bodemvocht")
+    if raw is None:
+        return 0, 0     # (nog) geen meting
     percent = (DRY - raw) * 100 / (DRY - WET)
     percent = max(0, min(100, percent))
     return int(percent), raw
@@ -76,7 +82,9 @@ DARK = 2000
 BRIGHT = 30000
 
 def read_light():
-    raw = light_channel.value
+    raw = latest_raw("licht")
+    if raw is None:
+        return 0, 0
     
     percent = (raw - DARK) * 100 / (BRIGHT - DARK)
     percent = max(0, min(100, percent))
@@ -1,12 +1,15 @@
 import tkinter as tk
+import os
+import sys
 import time
 import threading
 import RPi.GPIO as GPIO
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from test-components.servo_plantwacht.py import open_kraan, dicht_kraan, status as servo_status
+
+from i2c_bus import channel
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "plantwacht", "test-components", "servo"))
+from servo_plantwacht import open_kraan, dicht_kraan, status as servo_status
 
 # ---------------------------------------------------------
 # CONFIGURATIE & PINS
@@ -21,54 +24,32 @@ GPIO.setup(ECHO, GPIO.IN)
 WET = 12000
 DRY = 26000
 
+# Bodemvocht op A0; de bus wordt een keer geopend en gedeeld (i2c_bus.py)
+moisture_channel = channel(0)
+
 # ---------------------------------------------------------
-import requests  # voor de cloud verbinding
+# CLOUD (Render API)
 # ---------------------------------------------------------
-# --- CONFIGURATIE ---
-# Gebruik de URL uit je logs!
-RENDER_URL = "https://smartworld-nbyf.onrender.com/log_data"
+from uplink import Uplink, default_device_id
 
+RENDER_URL = "https://smartworld-nbyf.onrender.com"
+# Elke Pi stuurt zijn eigen id mee (serienummer van de Pi), plant optioneel
+DEVICE_ID = default_device_id()
+PLANT_ID = None
 
-def stuur_data_naar_cloud(licht_waarde, vocht_waarde, is_gegeven):
-    """Verstuurt sensorwaarden naar de Render API."""
-    params = {
-        "licht": licht_waarde,
-        "bodemvocht": vocht_waarde,
-        "water_gegeven": is_gegeven
-    }
-    try:
-        response = requests.post(RENDER_URL, params=params, timeout=5)
-        if response.status_code == 200:
-            print("Cloud update: Succes!")
-        else:
-            print(f"Cloud update mislukt: {response.status_code}")
-    except Exception as e:
-        print(f"Netwerkfout: {e}")
+# Versturen gebeurt in een eigen thread; de knoppen wachten nooit op het netwerk.
+# Zonder wifi gaan metingen naar de spool op de SD-kaart en later alsnog weg.
+UPLINK_SPOOL = os.path.join(BASE_DIR, "uplink_spool.db")
+# Een blijvende verbinding (keep-alive) en gzip voor grote batches uit de spool.
+uplink = Uplink(RENDER_URL, device_id=DEVICE_ID, plant_id=PLANT_ID, binary=True,
+                spool_path=UPLINK_SPOOL, compress=True)
+uplink.start()
 
 
-# --- BIJ DE VOCHTMETING ---
-def show_moisture_screen():
-    clear_screen()
-    p, r = get_moisture_data()
-    # Stuur de meting naar de cloud
-    stuur_data_naar_cloud(licht_waarde=r, vocht_waarde=p, is_gegeven=False)
-
-    tk.Label(root, text="Vochtmeting", font=("Arial", 22)).pack(pady=20)
-    tk.Label(root, text=f"{p}%", font=("Arial", 40), fg="blue").pack(pady=10)
-    tk.Button(root, text="← Terug", command=show_start_screen).pack(pady=20)
-
+def stuur_data_naar_cloud(licht_waarde, vocht_waarde, is_gegeven):
+    """Zet sensorwaarden klaar voor de Render API (komt meteen terug)."""
+    uplink.send(licht=licht_waarde, bodemvocht=vocht_waarde, water_gegeven=is_gegeven)
 
-# --- BIJ HET WATER GEVEN ---
-# In je water_task functie binnen show_water_screen:
-def water_task(action):
-    if action == "open":
-        msg = open_kraan()
-        # Log dat er water is gegeven
-        p, r = get_moisture_data()
-        stuur_data_naar_cloud(licht_waarde=r, vocht_waarde=p, is_gegeven=True)
-    else:
-        msg = dicht_kraan()
-    status_label.config(text=msg)
 
 # ---------------------------------------------------------
 # HARDWARE FUNCTIES
@@ -97,16 +78,16 @@ def afstand():
 
 
 def get_moisture_data():
-    """Leest de ADS1115 uit. Geeft mock-data bij fouten."""
+    """
+    Leest de ADS1115 uit: (procent, raw, echt). Bij fouten mock-data met
+    echt=False; die is alleen voor het scherm en gaat niet naar de cloud.
+    """
     try:
-        i2c = busio.I2C(board.SCL, board.SDA)
-        ads = ADS.ADS1115(i2c)
-        chan = AnalogIn(ads, ADS.P0)
-        raw = chan.value
+        raw = moisture_channel.value
         percent = max(0, min(100, (DRY - raw) * 100 / (DRY - WET)))
-        return int(percent), raw
+        return int(percent), raw, True
     except:
-        return 50, 20000  # Mock data
+        return 50, 20000, False  # Mock data
 
 
 # ---------------------------------------------------------
@@ -132,7 +113,11 @@ def show_start_screen():
 
 def show_moisture_screen():
     clear_screen()
-    p, r = get_moisture_data()
+    p, r, echt = get_moisture_data()
+    # Stuur de meting naar de cloud (geen lichtsensor op deze Pi: licht leeg)
+    if echt:
+        stuur_data_naar_cloud(licht_waarde=None, vocht_waarde=p, is_gegeven=False)
+
     tk.Label(root, text="Vochtmeting", font=("Arial", 22)).pack(pady=20)
     tk.Label(root, text=f"{p}%", font=("Arial", 40), fg="blue").pack(pady=10)
     tk.Button(root, text="← Terug", command=show_start_screen).pack(pady=20)
@@ -148,6 +133,10 @@ def show_water_screen():
     def water_task(action):
         if action == "open":
             msg = open_kraan()
+            # Log dat er water is gegeven
+            p, r, echt = get_moisture_data()
+            if echt:
+                stuur_data_naar_cloud(licht_waarde=None, vocht_waarde=p, is_gegeven=True)
         else:
             msg = dicht_kraan()
         status_label.config(text=msg)
@@ -177,4 +166,6 @@ def proximity_check():
 threading.Thread(target=proximity_check, daemon=True).start()
 
 root.mainloop()
+uplink.stop()
+print(f"Uplink: {uplink.snapshot()}")
 GPIO.cleanup()
\ No newline at end of file
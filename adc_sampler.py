@@ -0,0 +1,293 @@
+"""
+Burst-metingen met de ADS1115 in continuous mode.
+
+In single-shot mode kost elke ch.value een eigen conversie: config
+schrijven, wachten tot hij klaar is (pollen over I2C) en dan lezen. In
+continuous mode converteert de ADC zelf door op data_rate (tot 860 SPS) en
+is een sample alleen nog een korte I2C read van het conversieregister.
+
+Het tempo komt van de ALERT/RDY pin (pulst na elke conversie) als die is
+aangesloten, anders van timed polling op 1/data_rate.
+
+De ADS is gedeeld (i2c_bus.py): een burst houdt de buslock vast en zet de
+ADS daarna terug in single-shot op de oude data rate, zodat andere
+gebruikers er niets van merken.
+
+De mode gaat zelf naar het config-register (_write_mode): alleen
+adafruit_ads1x15 3.x schrijft dat bij ads.mode = ..., in 2.x bleef de chip
+in single-shot en gaf de burst steeds dezelfde oude conversie (stdev 0).
+
+    sampler = BurstSampler(i2c_bus.channel(0))
+    burst = sampler.burst(32)     # ~40 ms bij 860 SPS
+    raw = burst["median"]
+
+Meerdere ingangen: ScanScheduler leest ze om de beurt in een eigen thread,
+elk op zijn eigen tempo, en publiceert de metingen.
+"""
+import threading
+import time
+from statistics import mean, median, pstdev
+
+from adafruit_ads1x15.ads1x15 import Mode
+
+from i2c_bus import BUS_ERRORS, channel
+
+DATA_RATE = 860         # samples per seconde (ADS1115: 8..860)
+BURST_SAMPLES = 32      # ~37 ms bij 860 SPS
+
+# Config-register van de ADS1x15 (datasheet), voor _write_mode
+_REG_CONFIG = 0x01
+_MUX_MASK = 0x7000
+_GAIN_BITS = {2 / 3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+_COMP_QUEUE_BITS = {0: 0x0003, 1: 0x0000, 2: 0x0001, 4: 0x0002}   # 0 = comparator uit
+
+
+def _write_mode(ads, mode):
+    """
+    Schrijft mode met de huidige gain en data rate naar het config-register;
+    de mux blijft zoals hij staat. Niet via de setter, die schrijft alleen
+    in adafruit_ads1x15 3.x.
+    """
+    mux = ads._read_register(_REG_CONFIG) & _MUX_MASK
+    config = mux | _GAIN_BITS[ads.gain] | mode | ads.rate_config[ads.data_rate]
+    # Comparator-instellingen (ALERT/RDY) bestaan pas in 3.x; anders uit, zoals 2.x zelf doet
+    config |= getattr(ads, "comparator_mode", 0) | getattr(ads, "comparator_polarity", 0)
+    config |= getattr(ads, "comparator_latch", 0)
+    config |= _COMP_QUEUE_BITS[getattr(ads, "comparator_queue_length", 0)]
+    ads._write_register(_REG_CONFIG, config)
+
+
+class BurstSampler:
+    """
+    channel: een i2c_bus.Channel. rdy_pin: BCM pin aan ALERT/RDY (optioneel).
+    """
+
+    def __init__(self, channel, data_rate=DATA_RATE, rdy_pin=None):
+        self.channel = channel
+        self.data_rate = data_rate
+        self.period = 1.0 / data_rate
+        self.rdy_pin = rdy_pin
+        self._gpio = None
+        self._rdy_ads = None    # ADS waarop ALERT/RDY is ingesteld (na een heropening opnieuw)
+
+        self.bursts = 0
+        self.errors = 0         # mislukte I2C reads (sample overgeslagen)
+        self.last = None
+
+    def _setup_rdy(self, ads):
+        # Hi_thresh MSB = 1 en Lo_thresh MSB = 0: ALERT/RDY wordt een conversion-ready
+        # pin die na elke conversie kort laag gaat
+        self._rdy_ads = ads
+        try:
+            import RPi.GPIO as GPIO
+            ads.comparator_low_threshold = 0
+            ads.comparator_high_threshold = -32768
+            ads.comparator_queue_length = 1
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.rdy_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        except (ImportError, AttributeError) as e:
+            print(f"ALERT/RDY niet bruikbaar ({e}), timed polling")
+            self._gpio = None
+            return
+        self._gpio = GPIO
+
+    def _select(self, ads, analog):
+        # In continuous mode laat adafruit_ads1x15 de mux staan zoals hij was. Dus: een
+        # single-shot conversie op deze ingang zet de mux, dan pas continuous aan (zelf
+        # in het register, zie _write_mode), en de register pointer terug op het
+        # conversieregister voor de snelle reads. Daarna twee conversies wachten tot de
+        # waarde gesetteld is.
+        ads.data_rate = self.data_rate
+        ads.mode = Mode.SINGLE
+        analog.value
+        ads.mode = Mode.CONTINUOUS
+        _write_mode(ads, Mode.CONTINUOUS)
+        ads.get_last_result()
+        time.sleep(2 * self.period)
+
+    def _wait_ready(self):
+        # Hoogstens twee conversies wachten; een gemiste puls kost dan geen hele burst
+        timeout_ms = max(1, int(2000 * self.period) + 1)
+        if self._gpio.wait_for_edge(self.rdy_pin, self._gpio.FALLING, timeout=timeout_ms) is None:
+            time.sleep(self.period)
+
+    def burst(self, n=BURST_SAMPLES):
+        """
+        n samples zo snel als de ADC ze levert. Geeft een dict met n, median,
+        mean, stdev, min, max en duration_s terug, of None als het niet lukte.
+        """
+        t0 = time.perf_counter()
+        try:
+            vals = self.channel.run(lambda ads, analog: self._collect(ads, analog, n))
+        except BUS_ERRORS:
+            self.errors += 1
+            return None
+        duration = time.perf_counter() - t0
+        self.bursts += 1
+
+        self.last = {
+            "n": len(vals),
+            "median": int(median(vals)),
+            "mean": mean(vals),
+            "stdev": pstdev(vals),
+            "min": min(vals),
+            "max": max(vals),
+            "duration_s": duration,
+        }
+        return self.last
+
+    def _collect(self, ads, analog, n):
+        # Onder de buslock (Channel.run); een fout hier laat i2c_bus de bus heropenen
+        if self.rdy_pin is not None and self._rdy_ads is not ads:
+            self._setup_rdy(ads)
+        prev_rate = ads.data_rate
+        vals = []
+        try:
+            # Elke burst opnieuw: een andere gebruiker van de ADS kan de mux verzet hebben
+            self._select(ads, analog)
+            next_t = time.perf_counter()
+            for i in range(n):
+                if i:
+                    if self._gpio is not None:
+                        self._wait_ready()
+                    else:
+                        next_t += self.period
+                        delay = next_t - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                try:
+                    vals.append(int(analog.value))
+                except BUS_ERRORS:
+                    self.errors += 1    # I2C hik: dit sample overslaan
+        finally:
+            # Terug naar single-shot en de oude data rate, zoals de rest hem verwacht.
+            # De setters zetten de waarde voor ze schrijven; mislukt het schrijven, dan
+            # gaat de volgende single-shot read alsnog met de goede config. Het register
+            # zelf schrijven zet de chip ook echt stil (2.x: pas bij de volgende read).
+            try:
+                ads.mode = Mode.SINGLE
+            finally:
+                ads.data_rate = prev_rate
+            try:
+                _write_mode(ads, Mode.SINGLE)
+            except BUS_ERRORS:
+                self.errors += 1
+        if not vals:
+            raise OSError("geen enkel sample gelukt")
+        return vals
+
+
+# Kanalen als lijst, bv. bodemvocht 2x per seconde en licht eens per 2 s:
+#   [{"name": "bodemvocht", "pin": 0, "rate_hz": 2.0}, {"name": "licht", "pin": 2, "rate_hz": 0.5}]
+# Optioneel per kanaal "samples" (burstgrootte).
+class ScanScheduler:
+    """
+    Een thread die de ingestelde kanalen om de beurt uitleest, elk op zijn
+    eigen tempo (de eerst-verlopen beurt gaat voor). Mux wisselen en settelen
+    doet BurstSampler. Elke meting gaat als dict (name, pin, timestamp, raw,
+    burst) naar de subscribers en blijft als laatste meting per kanaal staan;
+    UI, LEDs en uplink lezen alleen latest() en komen zelf niet aan de bus.
+    """
+
+    def __init__(self, channels, data_rate=DATA_RATE, samples=BURST_SAMPLES, rdy_pin=None):
+        self._entries = []
+        for c in channels:
+            self._entries.append({
+                "name": c["name"],
+                "pin": c["pin"],
+                "period": 1.0 / c["rate_hz"],
+                "samples": c.get("samples", samples),
+                "sampler": BurstSampler(channel(c["pin"]), data_rate, rdy_pin),
+                "due": 0.0,
+                "scans": 0,
+                "missed": 0,    # burst mislukt
+                "late": 0,      # beurt pas na een hele periode gehaald
+            })
+        self._subscribers = []
+        self._latest = {}
+        self._tried = set()     # kanalen die al minstens een beurt gehad hebben
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def subscribe(self, fn):
+        """fn(sample) na elke meting, vanuit de scan-thread: houd hem kort."""
+        self._subscribers.append(fn)
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="adc-scan", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def latest(self, name, wait=0):
+        """
+        Laatste meting van dit kanaal, of None. Heeft het kanaal nog geen
+        beurt gehad, dan hoogstens wait sec daarop wachten (een kapotte
+        sensor kost dus maar een keer wachttijd).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: name in self._tried or self._stopping, wait)
+            return self._latest.get(name)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entry = min(self._entries, key=lambda e: e["due"])
+                self._cond.wait_for(lambda: self._stopping, max(0.0, entry["due"] - time.monotonic()))
+                if self._stopping:
+                    return
+
+            burst = entry["sampler"].burst(entry["samples"])
+            now = time.monotonic()
+            entry["scans"] += 1
+            # Vast ritme; loopt een beurt een hele periode achter, dan niet inhalen
+            entry["due"] += entry["period"]
+            if entry["due"] < now:
+                entry["late"] += entry["scans"] > 1
+                entry["due"] = now + entry["period"]
+            if burst is None:
+                entry["missed"] += 1
+                with self._cond:
+                    self._tried.add(entry["name"])
+                    self._cond.notify_all()
+                continue
+
+            sample = {
+                "name": entry["name"],
+                "pin": entry["pin"],
+                "timestamp": time.time(),
+                "raw": burst["median"],
+                "burst": burst,
+            }
+            with self._cond:
+                self._latest[entry["name"]] = sample
+                self._tried.add(entry["name"])
+                self._cond.notify_all()
+            for fn in self._subscribers:
+                try:
+                    fn(sample)
+                except Exception as e:
+                    print(f"ADC subscriber mislukt: {e}")
+
+    def snapshot(self):
+        now = time.time()
+        result = {}
+        for e in self._entries:
+            last = self._latest.get(e["name"])
+            result[e["name"]] = {
+                "pin": e["pin"],
+                "rate_hz": round(1.0 / e["period"], 3),
+                "scans": e["scans"],
+                "missed": e["missed"],
+                "late": e["late"],
+                "age_s": round(now - last["timestamp"], 2) if last else None,
+            }
+        return result
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from collections import deque
+from datetime import timedelta
+
+# Regels als JSON lijst, bv.
+#   [{"name": "droge_grond", "type": "below", "metric": "bodemvocht", "threshold": 30, "for_s": 1200}]
+# Types: below / above (waarde aaneengesloten onder/boven de drempel voor for_s
+# seconden) en no_rise (water gegeven, maar metric stijgt niet min_rise binnen within_s).
+DEFAULT_ALERT_RULES = [
+    {"name": "droge_grond", "type": "below", "metric": "bodemvocht", "threshold": 30, "for_s": 1200},
+    {"name": "water_zonder_effect", "type": "no_rise", "metric": "bodemvocht", "min_rise": 5, "within_s": 600},
+]
+ALERT_RULES = os.environ.get('ALERT_RULES')
+ALERT_TICK_S = float(os.environ.get('ALERT_TICK_S', '5'))               # timers zonder nieuwe meting
+ALERT_MAX_PENDING = int(os.environ.get('ALERT_MAX_PENDING', '100000'))  # metingen in de wachtrij
+ALERT_SEND_TIMEOUT_S = float(os.environ.get('ALERT_SEND_TIMEOUT_S', '10'))  # per melding (on_alert)
+# Optioneel: elke melding ook als JSON POST naar deze URL (bv. een chat webhook)
+ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+
+
+class ThresholdRule:
+    """
+    Waarde aaneengesloten onder (of boven) de drempel voor for_s seconden.
+    Per apparaat alleen: tijd laatste meting, sinds wanneer, en of hij actief is.
+    """
+
+    def __init__(self, name, metric, threshold, for_s, above=False):
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.duration = timedelta(seconds=for_s)
+        self.above = above
+        self._state = {}    # device_id -> [laatste ts, sinds, actief]
+
+    def update(self, row):
+        device, ts, value = row["device_id"], row["timestamp"], row[self.metric]
+        if value is None:
+            return None     # deze meting heeft de waarde niet (bv. geen lichtsensor)
+        st = self._state.get(device)
+        if st is None:
+            st = self._state[device] = [None, None, False]
+        elif ts <= st[0]:
+            return None     # late (gebufferde) meting: verandert het venster niet
+        st[0] = ts
+
+        breach = value > self.threshold if self.above else value < self.threshold
+        if not breach:
+            st[1] = None
+            if st[2]:
+                st[2] = False
+                return _alert(self, device, ts, "resolved", value)
+            return None
+        if st[1] is None:
+            st[1] = ts
+        if not st[2] and ts - st[1] >= self.duration:
+            st[2] = True
+            return _alert(self, device, ts, "firing", value, since=st[1].isoformat())
+        return None
+
+    def check_timers(self, mono):
+        return []
+
+
+class NoRiseRule:
+    """
+    Na water geven moet metric binnen within_s minstens min_rise stijgen.
+    Per apparaat: de open watergift (tijd, startwaarde, hoogste waarde sindsdien).
+    """
+
+    def __init__(self, name, metric, min_rise, within_s):
+        self.name = name
+        self.metric = metric
+        self.min_rise = min_rise
+        self.within = timedelta(seconds=within_s)
+        self._last = {}     # device_id -> (laatste ts, time.monotonic() toen hij binnenkwam)
+        self._open = {}     # device_id -> [water ts, startwaarde, hoogste waarde]
+
+    def update(self, row):
+        device, ts, value = row["device_id"], row["timestamp"], row[self.metric]
+        last = self._last.get(device)
+        if last is not None and ts <= last[0]:
+            return None
+        self._last[device] = (ts, time.monotonic())
+        if value is None:
+            return None
+
+        window = self._open.get(device)
+        if window is not None:
+            window[2] = max(window[2], value)
+            if window[2] - window[1] >= self.min_rise:
+                del self._open[device]
+            elif ts - window[0] >= self.within:
+                del self._open[device]
+                return self._fire(device, window, ts)
+        if row["water_gegeven"]:
+            self._open[device] = [ts, value, value]
+        return None
+
+    def check_timers(self, mono):
+        # Apparaat zwijgt na het water geven: ook dan na within_s melden. "Nu" volgt de
+        # klok van het apparaat (laatste timestamp + tijd sinds die binnenkwam), niet die
+        # van de server: een scheve klok of een nagestuurde spool geeft geen valse melding.
+        alerts = []
+        for device, window in list(self._open.items()):
+            last_ts, seen = self._last[device]
+            now = last_ts + timedelta(seconds=mono - seen)
+            if now - window[0] >= self.within:
+                del self._open[device]
+                alerts.append(self._fire(device, window, now))
+        return alerts
+
+    def _fire(self, device, window, ts):
+        return _alert(self, device, ts, "firing", window[2],
+                      watered_at=window[0].isoformat(), start_value=window[1])
+
+
+# Velden van een meting waar een regel op kan letten
+METRICS = ("licht", "bodemvocht")
+
+_RULE_TYPES = {
+    "below": lambda r: ThresholdRule(r["name"], r["metric"], r["threshold"], r["for_s"]),
+    "above": lambda r: ThresholdRule(r["name"], r["metric"], r["threshold"], r["for_s"], above=True),
+    "no_rise": lambda r: NoRiseRule(r["name"], r["metric"], r["min_rise"], r["within_s"]),
+}
+
+
+def load_rules(config=None):
+    """Maakt regels van een JSON tekst of lijst (standaard: ALERT_RULES of DEFAULT_ALERT_RULES)."""
+    if config is None:
+        config = ALERT_RULES or DEFAULT_ALERT_RULES
+    if isinstance(config, str):
+        config = json.loads(config)
+    rules = []
+    for r in config:
+        factory = _RULE_TYPES.get(r.get("type"))
+        if factory is None:
+            raise ValueError(f"onbekend alert type {r.get('type')!r}")
+        if r.get("metric") not in METRICS:
+            raise ValueError(f"alert {r.get('name')!r}: onbekende metric {r.get('metric')!r} (kies uit {', '.join(METRICS)})")
+        try:
+            rules.append(factory(r))
+        except KeyError as e:
+            raise ValueError(f"alert {r.get('name')!r}: veld {e.args[0]!r} ontbreekt") from None
+    return rules
+
+
+def post_webhook(url, alert, timeout=5):
+    """Blokkerend; aanroepen vanuit een thread."""
+    req = urllib.request.Request(
+        url, data=json.dumps(alert).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+
+
+def _alert(rule, device, ts, state, value, **extra):
+    return {
+        "rule": rule.name,
+        "device_id": device,
+        "state": state,
+        "timestamp": ts.isoformat(),
+        "metric": rule.metric,
+        "value": value,
+        **extra,
+    }
+
+
+class AlertEngine:
+    """
+    Evalueert de regels op elke nieuwe meting. feed() zet de rijen alleen in
+    een wachtrij (O(1)); de evaluatie gebeurt in een eigen taak, buiten het
+    request, zonder extra queries. on_alert(alert) loopt per melding in een
+    eigen taak met een timeout: een trage webhook houdt de evaluatie en de
+    andere meldingen niet op.
+    """
+
+    def __init__(self, rules, on_alert, tick_s=5, max_pending=100000, keep=200,
+                 send_timeout_s=ALERT_SEND_TIMEOUT_S):
+        self.rules = rules
+        self.on_alert = on_alert
+        self.tick_s = tick_s
+        self.max_pending = max_pending
+        self.send_timeout_s = send_timeout_s
+        self.recent = deque(maxlen=keep)
+        self._pending = deque()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._sending = set()   # lopende on_alert taken (referentie houden)
+        self.evaluated = 0
+        self.fired = 0
+        self.dropped = 0
+        self.send_failed = 0
+        self.rule_errors = 0
+        self._logged_rule_errors = set()    # (regel, fout) al gelogd: niet elke meting opnieuw
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def feed(self, rows):
+        room = self.max_pending - len(self._pending)
+        if len(rows) > room:
+            # Liever een meting overslaan dan het geheugen vol laten lopen
+            self.dropped += len(rows) - max(room, 0)
+            rows = rows[:max(room, 0)]
+        self._pending.extend(rows)
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.tick_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            alerts = []
+            n = 0
+            while self._pending:
+                row = self._pending.popleft()
+                for rule in self.rules:
+                    try:
+                        alert = rule.update(row)
+                    except Exception as e:
+                        self._rule_failed(rule, e)
+                        continue
+                    if alert is not None:
+                        alerts.append(alert)
+                n += 1
+                if n % 1000 == 0:
+                    await asyncio.sleep(0)      # grote batch: de event loop niet ophouden
+            self.evaluated += n
+
+            mono = time.monotonic()
+            for rule in self.rules:
+                try:
+                    alerts.extend(rule.check_timers(mono))
+                except Exception as e:
+                    self._rule_failed(rule, e)
+
+            for alert in alerts:
+                self.fired += alert["state"] == "firing"
+                self.recent.append(alert)
+                task = asyncio.create_task(self._send(alert))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+
+    def _rule_failed(self, rule, error):
+        # Een kapotte regel mag de andere regels en de taak niet stilleggen
+        self.rule_errors += 1
+        msg = f"{type(error).__name__}: {error}"
+        if (rule.name, msg) not in self._logged_rule_errors:
+            self._logged_rule_errors.add((rule.name, msg))
+            print(f"Alert regel {rule.name} mislukt: {msg}")
+
+    async def _send(self, alert):
+        try:
+            await asyncio.wait_for(self.on_alert(alert), self.send_timeout_s)
+        except asyncio.TimeoutError:
+            self.send_failed += 1
+            print(f"Alert versturen duurde langer dan {self.send_timeout_s}s: {alert['rule']} {alert['device_id']}")
+        except Exception as e:
+            self.send_failed += 1
+            print(f"Alert versturen mislukt: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._sending):
+            task.cancel()
+
+    def snapshot(self):
+        return {
+            "rules": [r.name for r in self.rules],
+            "pending": len(self._pending),
+            "evaluated": self.evaluated,
+            "fired": self.fired,
+            "dropped": self.dropped,
+            "sending": len(self._sending),
+            "send_failed": self.send_failed,
+            "rule_errors": self.rule_errors,
+        }
@@ -0,0 +1,149 @@
+import os
+import re
+from datetime import datetime, timedelta, time as dtime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:     # archiveren is optioneel (pip install pyarrow)
+    pa = None
+
+from readings import EXPORT_COLUMNS
+
+# Verlopen dagpartities worden voor het weggooien als Parquet (kolom-
+# georienteerd, gecomprimeerd) in deze map gezet. Leeg = niet archiveren.
+# Op Render moet dit een persistent disk zijn.
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '')
+ARCHIVE_COMPRESSION = os.environ.get('ARCHIVE_COMPRESSION', 'zstd')
+ARCHIVE_ROW_GROUP = int(os.environ.get('ARCHIVE_ROW_GROUP', '100000'))
+
+# sensor_data_20260101.parquet, en bij een tweede archief van dezelfde dag
+# (late metingen) sensor_data_20260101.1.parquet
+_FILE_RE = re.compile(r"^sensor_data_(\d{8})(?:\.(\d+))?\.parquet$")
+
+_COLUMNS = ("id", "timestamp", "device_id", "plant_id", "licht", "bodemvocht", "water_gegeven", "seq")
+
+
+def available():
+    return pa is not None
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("device_id", pa.string()),
+        ("plant_id", pa.string()),
+        ("licht", pa.float64()),
+        ("bodemvocht", pa.float64()),
+        ("water_gegeven", pa.bool_()),
+        ("seq", pa.int64()),
+    ])
+
+
+def list_archived(archive_dir=ARCHIVE_DIR):
+    """Geeft [(dag, pad)] van alle archiefbestanden, oud naar nieuw."""
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return []
+    result = []
+    for name in os.listdir(archive_dir):
+        m = _FILE_RE.match(name)
+        if m:
+            day = datetime.strptime(m.group(1), "%Y%m%d").date()
+            result.append((day, int(m.group(2) or 0), os.path.join(archive_dir, name)))
+    return [(day, path) for day, _part, path in sorted(result)]
+
+
+def _free_path(archive_dir, day):
+    base = os.path.join(archive_dir, f"sensor_data_{day:%Y%m%d}")
+    path = base + ".parquet"
+    part = 0
+    while os.path.exists(path):
+        part += 1
+        path = f"{base}.{part}.parquet"
+    return path
+
+
+def archive_partition(conn, table, day, archive_dir=ARCHIVE_DIR, chunk_rows=50000):
+    """
+    Schrijft alle rijen van partitie {table} naar een Parquet bestand.
+    Het bestand krijgt pas zijn echte naam als het compleet en gecontroleerd
+    is; geeft (tijdelijk pad, definitief pad, aantal rijen) terug, de
+    aanroeper zet het met publish_archive() definitief neer.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is niet geinstalleerd; archiveren kan niet")
+    os.makedirs(archive_dir, exist_ok=True)
+    path = _free_path(archive_dir, day)
+    tmp = path + ".tmp"
+    schema = _schema()
+
+    cur = conn.cursor(name=f"archive_{table}")
+    cur.itersize = chunk_rows
+    cur.execute(f"SELECT {', '.join(_COLUMNS)} FROM {table} ORDER BY timestamp")
+    n = 0
+    try:
+        with pq.ParquetWriter(tmp, schema, compression=ARCHIVE_COMPRESSION) as writer:
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                arrays = [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=ARCHIVE_ROW_GROUP)
+                n += len(rows)
+        # Eerst zeker weten dat alles op schijf staat, daarna pas weggooien
+        if pq.ParquetFile(tmp).metadata.num_rows != n:
+            raise RuntimeError(f"archief {tmp} is onvolledig")
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        cur.close()
+    return tmp, path, n
+
+
+def publish_archive(tmp, path):
+    os.replace(tmp, path)
+
+
+def read_archive(start, end, device=None, chunk_rows=5000, archive_dir=ARCHIVE_DIR):
+    """
+    Generator met lijsten rijen (in EXPORT_COLUMNS volgorde) uit het archief,
+    voor start <= timestamp < end. Alleen de bestanden van de gevraagde dagen
+    worden geopend en alleen de nodige kolommen gelezen.
+    """
+    if pa is None:
+        return
+    ts_type = pa.timestamp("us")
+    lo, hi = pa.scalar(start, type=ts_type), pa.scalar(end, type=ts_type)
+    for day, path in list_archived(archive_dir):
+        day_start = datetime.combine(day, dtime.min)
+        if day_start >= end or day_start + timedelta(days=1) <= start:
+            continue
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=list(EXPORT_COLUMNS)):
+            ts = batch.column("timestamp")
+            mask = pc.and_(pc.greater_equal(ts, lo), pc.less(ts, hi))
+            if device is not None:
+                mask = pc.and_(mask, pc.equal(batch.column("device_id"), device))
+            batch = batch.filter(mask)
+            if batch.num_rows:
+                yield list(zip(*(batch.column(c).to_pylist() for c in EXPORT_COLUMNS)))
+
+
+def archive_summary(archive_dir=ARCHIVE_DIR):
+    """Overzicht voor /archive: per bestand de dag, het aantal rijen en de grootte."""
+    files = []
+    for day, path in list_archived(archive_dir):
+        rows = pq.ParquetFile(path).metadata.num_rows if pa is not None else None
+        files.append({
+            "day": day.isoformat(),
+            "file": os.path.basename(path),
+            "rows": rows,
+            "bytes": os.path.getsize(path),
+        })
+    return {"enabled": bool(archive_dir) and pa is not None, "files": files}
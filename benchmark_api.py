@@ -0,0 +1,319 @@
+"""
+Belastingstest voor API.py.
+
+Voorbeeld (start zelf een API tegen een lokale Postgres):
+
+    python benchmark_api.py --start-server --database-url postgresql://localhost/smartworld_bench \\
+        --scenario log_data --scenario batch --concurrency 32 --devices 200 --duration 30
+
+Of tegen een API die al draait:
+
+    python benchmark_api.py --url http://127.0.0.1:8000 --scenario readings
+
+Resultaten (doorvoer en p50/p95/p99 latency per scenario) worden als JSON
+opgeslagen in bench_results/, met --compare kun je twee runs vergelijken.
+Met --start-server wordt ook de cold start gemeten: tijd tot /ready en tot
+de eerste gelukte insert.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+
+from reading_codec import encode_readings, CONTENT_TYPE as BINARY_CONTENT_TYPE
+
+SCENARIOS = ("log_data", "batch", "binary", "readings", "latest")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest-rank methode
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def _reading(device, ts=None):
+    return {
+        "timestamp": ts,
+        "device_id": device,
+        "licht": round(random.uniform(0, 100), 2),
+        "bodemvocht": round(random.uniform(10, 90), 2),
+        "water_gegeven": random.random() < 0.01,
+    }
+
+
+def make_request(scenario, device, batch_size):
+    """Geeft (method, path, body, headers, aantal metingen) voor een request."""
+    if scenario == "log_data":
+        r = _reading(device)
+        params = {k: v for k, v in r.items() if k != "timestamp"}
+        params["water_gegeven"] = str(params["water_gegeven"]).lower()
+        return "POST", "/log_data?" + urlencode(params), None, {}, 1
+
+    if scenario == "batch":
+        now = time.time()
+        rows = [_reading(device, datetime.fromtimestamp(now - i).isoformat()) for i in range(batch_size)]
+        body = json.dumps(rows).encode()
+        return "POST", "/log_data/batch", body, {"Content-Type": "application/json"}, batch_size
+
+    if scenario == "binary":
+        now = time.time()
+        rows = [_reading(device, now - i) for i in range(batch_size)]
+        body = encode_readings(rows, device_id=device)
+        return "POST", "/log_data/batch", body, {"Content-Type": BINARY_CONTENT_TYPE}, batch_size
+
+    if scenario == "readings":
+        params = {"bucket": random.choice(["1m", "5m", "1h"]), "device": device}
+        return "GET", "/readings?" + urlencode(params), None, {}, 0
+
+    if scenario == "latest":
+        return "GET", f"/latest/{device}", None, {}, 0
+
+    raise ValueError(f"onbekend scenario {scenario}")
+
+
+class Worker(threading.Thread):
+    """Een client met een eigen keep-alive verbinding."""
+
+    def __init__(self, url, scenario, devices, batch_size, deadline, max_requests):
+        super().__init__(daemon=True)
+        self.url = urlparse(url)
+        self.scenario = scenario
+        self.devices = devices
+        self.batch_size = batch_size
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.latencies = []
+        self.errors = 0
+        self.status_counts = {}
+        self.readings = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+        return cls(self.url.hostname, self.url.port, timeout=30)
+
+    def run(self):
+        conn = self._connect()
+        done = 0
+        while time.perf_counter() < self.deadline and (self.max_requests is None or done < self.max_requests):
+            method, path, body, headers, n = make_request(self.scenario, random.choice(self.devices), self.batch_size)
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = self._connect()
+                status = "conn_error"
+            elapsed = time.perf_counter() - t0
+            done += 1
+
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status in (200, 304, 404):
+                self.latencies.append(elapsed)
+                self.readings += n
+            else:
+                self.errors += 1
+        conn.close()
+
+
+def run_scenario(url, scenario, concurrency, devices, batch_size, duration, max_requests):
+    deadline = time.perf_counter() + duration
+    per_worker = None if max_requests is None else max(1, max_requests // concurrency)
+    workers = [Worker(url, scenario, devices, batch_size, deadline, per_worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - t0
+
+    latencies = sorted(l for w in workers for l in w.latencies)
+    statuses = {}
+    for w in workers:
+        for k, v in w.status_counts.items():
+            statuses[str(k)] = statuses.get(str(k), 0) + v
+    ok = len(latencies)
+    readings = sum(w.readings for w in workers)
+
+    def ms(v):
+        return None if v is None else round(v * 1000, 2)
+
+    return {
+        "requests": ok + sum(w.errors for w in workers),
+        "ok": ok,
+        "errors": sum(w.errors for w in workers),
+        "status": statuses,
+        "seconds": round(wall, 3),
+        "requests_per_s": round(ok / wall, 1),
+        "readings_per_s": round(readings / wall, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def start_server(database_url, port):
+    """Start uvicorn en wacht tot /ready. Geeft (proc, url, cold_start) terug."""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "API:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    cold_start = {"listening_s": None, "ready_s": None, "first_insert_s": None}
+    t_end = time.time() + 30
+    while time.time() < t_end:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/ready")
+            status = conn.getresponse().status
+            conn.close()
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit("API server stopte tijdens het opstarten")
+            time.sleep(0.05)
+            continue
+        if cold_start["listening_s"] is None:
+            cold_start["listening_s"] = round(time.perf_counter() - t0, 3)
+        if status == 200:
+            cold_start["ready_s"] = round(time.perf_counter() - t0, 3)
+            cold_start["first_insert_s"] = _first_insert(port, t0)
+            return proc, url, cold_start
+        time.sleep(0.05)
+    proc.terminate()
+    raise SystemExit("API server kwam niet op binnen 30s")
+
+
+def _first_insert(port, t0):
+    """Een enkele batch-insert (synchroon weggeschreven); sec sinds start van het proces."""
+    method, path, body, headers, _n = make_request("batch", "bench-coldstart", 1)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    resp.read()
+    conn.close()
+    if resp.status != 200:
+        return None
+    return round(time.perf_counter() - t0, 3)
+
+
+def git_version():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old, new):
+    print(f"\nVergelijking met {old.get('version')} ({old.get('started_at')}):")
+    if old.get("cold_start") and new.get("cold_start"):
+        parts = []
+        for key in ("ready_s", "first_insert_s"):
+            a, b = old["cold_start"].get(key), new["cold_start"].get(key)
+            if a and b is not None:
+                parts.append(f"{key} {a} -> {b} ({(b - a) / a * 100:+.0f}%)")
+        print("  cold start: " + ", ".join(parts))
+    for scenario, res in new["results"].items():
+        prev = old.get("results", {}).get(scenario)
+        if not prev:
+            continue
+        parts = []
+        for key in ("readings_per_s", "requests_per_s", "p50_ms", "p95_ms", "p99_ms"):
+            a, b = prev.get(key), res.get(key)
+            if a and b is not None:
+                parts.append(f"{key} {a} -> {b} ({(b - a) / a * 100:+.0f}%)")
+        print(f"  {scenario}: " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Belastingstest voor de SmartWorld API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true", help="start zelf uvicorn API:app")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="seconden per scenario")
+    parser.add_argument("--requests", type=int, default=None, help="of: vast aantal requests per scenario")
+    parser.add_argument("--out", default=None, help="JSON bestand (standaard bench_results/<versie>_<tijd>.json)")
+    parser.add_argument("--compare", default=None, help="eerder JSON resultaat om mee te vergelijken")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scenarios = args.scenario or ["log_data"]
+    devices = [f"bench-{i:04d}" for i in range(args.devices)]
+
+    proc = None
+    cold_start = None
+    url = args.url
+    if args.start_server:
+        if not args.database_url:
+            raise SystemExit("--start-server heeft --database-url (of DATABASE_URL) nodig")
+        proc, url, cold_start = start_server(args.database_url, args.port)
+        print(f"Cold start: luistert na {cold_start['listening_s']}s, klaar na {cold_start['ready_s']}s, "
+              f"eerste insert na {cold_start['first_insert_s']}s")
+
+    report = {
+        "version": git_version(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "url": url,
+            "concurrency": args.concurrency,
+            "devices": args.devices,
+            "batch_size": args.batch_size,
+            "duration": args.duration,
+            "requests": args.requests,
+        },
+        "cold_start": cold_start,
+        "results": {},
+    }
+    try:
+        for scenario in scenarios:
+            print(f"{scenario}: {args.concurrency} clients, {args.devices} apparaten ...", flush=True)
+            res = run_scenario(url, scenario, args.concurrency, devices, args.batch_size,
+                               args.duration, args.requests)
+            report["results"][scenario] = res
+            print(f"  {res['requests_per_s']} req/s, {res['readings_per_s']} metingen/s, "
+                  f"p50 {res['p50_ms']} ms, p95 {res['p95_ms']} ms, p99 {res['p99_ms']} ms, "
+                  f"fouten {res['errors']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=15)
+
+    out = args.out
+    if out is None:
+        os.makedirs("bench_results", exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = os.path.join("bench_results", f"{report['version'] or 'onbekend'}_{stamp}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultaat opgeslagen in {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+
+import psycopg2
+from psycopg2 import pool
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import DB_POOL_WAIT_SECONDS, ERRORS
+
+# Haal de database URL op uit de Render instellingen
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+# Pool instellingen (aan te passen via de Render environment)
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))              # sec wachten op vrije verbinding
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))          # sec voor TCP + login
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '10000'))
+
+_pool = None
+_slots = None
+# Gezet zodra de pool open is. De pool wordt op de achtergrond geopend,
+# requests die eerder komen wachten hierop (binnen DB_POOL_TIMEOUT).
+_opened = threading.Event()
+
+
+class PoolTimeout(Exception):
+    """Er kwam binnen DB_POOL_TIMEOUT seconden geen verbinding vrij."""
+
+
+# Fouten die aan een rij zelf liggen (waarde past niet, constraint); opnieuw proberen
+# helpt daar niet. Al het andere (database weg, schema achter, read-only na een
+# failover) gaat vanzelf over of na een ingreep, dus dan later opnieuw.
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+
+def open_pool():
+    """Maakt de verbindingspool aan (een keer, bij het opstarten)."""
+    global _pool, _slots
+    if _pool is not None:
+        return
+    _pool = pool.ThreadedConnectionPool(
+        DB_POOL_MIN,
+        DB_POOL_MAX,
+        DATABASE_URL,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+    )
+    # ThreadedConnectionPool gooit meteen een fout als alles bezet is;
+    # met de semafoor wachten we eerst (begrensd) op een vrije plek.
+    _slots = threading.BoundedSemaphore(DB_POOL_MAX)
+    _opened.set()
+
+
+def close_pool():
+    global _pool, _slots
+    if _pool is None:
+        return
+    _opened.clear()
+    _pool.closeall()
+    _pool = None
+    _slots = None
+
+
+def warm_pool(prepare=None):
+    """
+    Opent de pool en zet DB_POOL_MIN verbindingen klaar (TCP, TLS, login en
+    een eerste query), zodat het eerste echte request dat niet hoeft te doen.
+    prepare(cur) kan per verbinding extra voorbereiden (bv. tijdelijke tabellen).
+    """
+    open_pool()
+    with ExitStack() as stack:
+        # Allemaal tegelijk lenen, anders krijgen we steeds dezelfde terug
+        conns = [stack.enter_context(db_connection()) for _ in range(DB_POOL_MIN)]
+        for conn in conns:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            if prepare is not None:
+                prepare(cur)
+            conn.commit()
+            cur.close()
+
+
+@contextmanager
+def db_connection():
+    """
+    Leent een verbinding uit de pool en geeft hem daarna weer terug.
+    Commit doet de aanroeper zelf; bij een fout wordt er teruggerold.
+    """
+    t0 = time.perf_counter()
+    if not _opened.wait(DB_POOL_TIMEOUT):
+        ERRORS.inc("pool_timeout")
+        raise PoolTimeout("database is nog niet klaar")
+    wait_left = max(0.0, DB_POOL_TIMEOUT - (time.perf_counter() - t0))
+    slots, conn_pool = _slots, _pool
+    if not slots.acquire(timeout=wait_left):
+        ERRORS.inc("pool_timeout")
+        raise PoolTimeout(f"geen vrije databaseverbinding binnen {DB_POOL_TIMEOUT}s")
+
+    conn = None
+    try:
+        conn = conn_pool.getconn()
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - t0)
+        yield conn
+    except Exception as e:
+        if conn is not None and not conn.closed:
+            if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                # verbinding is waarschijnlijk stuk: niet terug in de pool
+                conn.close()
+            else:
+                conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            conn_pool.putconn(conn, close=bool(conn.closed))
+        slots.release()
+
+
+async def run_db(fn, *args, **kwargs):
+    """Voert blokkerend databasewerk uit in een thread, zodat de event loop vrij blijft."""
+    return await run_in_threadpool(fn, *args, **kwargs)
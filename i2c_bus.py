@@ -0,0 +1,116 @@
+"""
+Een I2C bus (en een ADS1115 per adres) voor het hele proces.
+
+Voorheen maakte elke module, en Plant6 zelfs elke meting, een eigen
+busio.I2C + ADS1115 aan. Hier wordt de bus een keer geopend; iedereen
+krijgt een Channel handle. Alle verkeer loopt onder een lock, zodat twee
+threads nooit door elkaars transactie heen praten, en na een busfout
+(los kabeltje, EMI van de servo) wordt de bus opnieuw geopend en de read
+nog een keer geprobeerd.
+
+    moisture = channel(0)
+    raw = moisture.value
+"""
+import threading
+
+import board
+import busio
+import adafruit_ads1x15.ads1115 as ADS
+from adafruit_ads1x15.analog_in import AnalogIn
+
+ADS_ADDRESS = 0x48
+ADS_GAIN = 1            # +-4.096 V, geschikt voor 3.3 V sensoren
+RETRIES = 1             # na een busfout: opnieuw openen en zo vaak opnieuw proberen
+
+# Een transactie (of een hele burst) tegelijk. RLock: een handle mag binnen
+# run() nog een keer lezen.
+lock = threading.RLock()
+
+_i2c = None
+_ads = {}               # adres -> ADS1115
+generation = 0          # +1 bij elke heropening; handles binden dan opnieuw
+reconnects = 0
+errors = 0
+
+BUS_ERRORS = (OSError, RuntimeError, ValueError)
+
+
+def get_ads(address=ADS_ADDRESS, gain=ADS_GAIN):
+    """De gedeelde ADS1115 op dit adres; opent de bus als dat nog niet gebeurd is."""
+    global _i2c
+    with lock:
+        ads = _ads.get(address)
+        if ads is None:
+            if _i2c is None:
+                _i2c = busio.I2C(board.SCL, board.SDA)
+            ads = _ads[address] = ADS.ADS1115(_i2c, gain=gain, address=address)
+        return ads
+
+
+def reset():
+    """Bus dicht; de volgende get_ads() opent hem opnieuw."""
+    global _i2c, generation, reconnects
+    with lock:
+        if _i2c is not None:
+            try:
+                _i2c.deinit()
+            except BUS_ERRORS:
+                pass
+        _i2c = None
+        _ads.clear()
+        generation += 1
+        reconnects += 1
+
+
+class Channel:
+    """Thread-safe handle op een ingang van een ADS1115 (pin 0..3)."""
+
+    def __init__(self, pin, address=ADS_ADDRESS, gain=ADS_GAIN, retries=RETRIES):
+        self.pin = pin
+        self.address = address
+        self.gain = gain
+        self.retries = retries
+        self._generation = None
+        self._ads = None
+        self._analog = None
+
+    def _bind(self):
+        # Na een heropening horen de oude ADS/AnalogIn objecten bij een dichte bus
+        if self._generation != generation or self._ads is None:
+            self._ads = get_ads(self.address, self.gain)
+            self._analog = AnalogIn(self._ads, self.pin)
+            self._generation = generation
+        return self._ads, self._analog
+
+    def run(self, fn):
+        """
+        fn(ads, analog_in) onder de buslock. Bij een busfout: bus opnieuw
+        openen en nog eens (retries keer); daarna gaat de fout naar de aanroeper.
+        """
+        global errors
+        with lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    return fn(*self._bind())
+                except BUS_ERRORS:
+                    errors += 1
+                    if attempt == self.retries:
+                        raise
+                    reset()
+
+    @property
+    def value(self):
+        return self.run(lambda _ads, analog: analog.value)
+
+    @property
+    def voltage(self):
+        return self.run(lambda _ads, analog: analog.voltage)
+
+
+def channel(pin, address=ADS_ADDRESS, gain=ADS_GAIN):
+    """Handle op een ingang; raakt de bus pas bij de eerste read."""
+    return Channel(pin, address, gain)
+
+
+def snapshot():
+    return {"open": _i2c is not None, "devices": sorted(_ads), "reconnects": reconnects, "errors": errors}
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import deque
+
+from database import run_db, ROW_ERRORS
+from metrics import ERRORS
+
+
+class BufferFull(Exception):
+    """De schrijfbuffer zit vol; de database loopt achter."""
+
+
+class IngestBuffer:
+    """
+    Write-behind buffer voor losse metingen.
+
+    Requests zetten hun meting in de buffer en krijgen direct antwoord.
+    Een achtergrondtaak schrijft alles wat zich verzameld heeft in een keer
+    weg (een commit), elke flush_ms milliseconden of zodra er flush_rows
+    metingen klaarstaan.
+
+    Ligt een mislukte flush aan de data (ROW_ERRORS), dan wordt de batch
+    gehalveerd tot de foute meting(en) overblijven; die gaan naar de
+    dead-letter lijst en de rest wordt gewoon weggeschreven. Zo houdt een
+    kapotte meting de ingest niet op. Elke andere fout (database weg, schema
+    achter, read-only) zet de batch terug vooraan de rij: de metingen zijn
+    al bevestigd, dus nooit weggooien omdat de database even niet wil.
+    """
+
+    def __init__(self, flush_fn, flush_ms=200, flush_rows=500, max_rows=50000, on_flushed=None,
+                 row_errors=ROW_ERRORS, keep_dead=100):
+        self.flush_fn = flush_fn            # blokkerende functie: flush_fn(rows)
+        self.on_flushed = on_flushed        # async functie: krijgt wat flush_fn teruggeeft
+        self.flush_interval = flush_ms / 1000
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.row_errors = row_errors
+        self.dead_letter = deque(maxlen=keep_dead)  # laatste metingen die niet weg konden
+
+        self._pending = []                  # lijst van (rij, future of None)
+        self._wake = None
+        self._task = None
+        self._closing = False
+
+        self.stats = {
+            "flushes": 0,
+            "flushed_rows": 0,
+            "failed_flushes": 0,
+            "dead_letter": 0,
+            "rejected_full": 0,
+            "max_depth": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "last_error": None,
+        }
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def add(self, row, wait=False):
+        """
+        Zet een rij klaar. Met wait=True krijg je een future terug die
+        afgaat zodra de rij gecommit is.
+        """
+        if self._closing:
+            raise BufferFull("buffer wordt afgesloten")
+        if len(self._pending) >= self.max_rows:
+            self.stats["rejected_full"] += 1
+            raise BufferFull(f"schrijfbuffer vol ({self.max_rows} metingen)")
+
+        fut = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.append((row, fut))
+
+        depth = len(self._pending)
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+        if depth >= self.flush_rows:
+            self._wake.set()
+        return fut
+
+    async def close(self, timeout=10):
+        """Schrijft de rest van de buffer weg en stopt de achtergrondtaak."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            print(f"Schrijfbuffer niet leeg bij afsluiten: {self.depth} metingen verloren")
+        self._task = None
+
+    def snapshot(self):
+        return {
+            "depth": self.depth,
+            "max_rows": self.max_rows,
+            **self.stats,
+            "dead_letter_recent": list(self.dead_letter)[-10:],
+        }
+
+    async def _run(self):
+        retry_delay = self.flush_interval
+        while True:
+            if not self._closing and len(self._pending) < self.flush_rows:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+
+            if not self._pending:
+                if self._closing:
+                    return
+                continue
+
+            if await self._flush():
+                retry_delay = self.flush_interval
+            elif self._closing:
+                print(f"Schrijfbuffer kon niet leeg bij afsluiten: {self.depth} metingen verloren")
+                return
+            else:
+                # database weg: rustig opnieuw proberen, niet in een strakke lus
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 5.0)
+
+    async def _flush(self):
+        """False als de database de batch nu niet aanneemt (batch staat weer vooraan), anders True."""
+        batch = self._pending[:self.flush_rows]
+        del self._pending[:len(batch)]
+
+        # Eerst de hele batch; wil die niet, dan de helften (stapel, in volgorde)
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            t0 = time.perf_counter()
+            try:
+                result = await run_db(self.flush_fn, [row for row, _ in part])
+            except self.row_errors as e:
+                self._failed(len(part), e)
+                if len(part) == 1:
+                    self._dead(part[0], e)
+                else:
+                    mid = len(part) // 2
+                    parts.append(part[mid:])
+                    parts.append(part[:mid])
+                continue
+            except Exception as e:
+                # terug vooraan de rij, volgorde blijft behouden
+                self._pending[:0] = part + [item for p in reversed(parts) for item in p]
+                self._failed(len(part), e)
+                return False
+            await self._flushed(part, result, t0)
+        return True
+
+    def _failed(self, n, error):
+        self.stats["failed_flushes"] += 1
+        ERRORS.inc("flush_failed")
+        self.stats["last_error"] = str(error)
+        print(f"Flush van {n} metingen mislukt: {error}")
+
+    def _dead(self, item, error):
+        row, fut = item
+        self.stats["dead_letter"] += 1
+        ERRORS.inc("dead_letter")
+        self.dead_letter.append({"row": str(row), "error": str(error)})
+        print(f"Meting kan niet weggeschreven worden, overgeslagen: {row} ({error})")
+        if fut is not None and not fut.done():
+            fut.set_result(False)
+
+    async def _flushed(self, batch, result, t0):
+        self.stats["flushes"] += 1
+        self.stats["flushed_rows"] += len(batch)
+        self.stats["last_flush_rows"] = len(batch)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        for _, fut in batch:
+            if fut is not None and not fut.done():
+                fut.set_result(True)
+
+        if self.on_flushed is not None:
+            try:
+                await self.on_flushed(result)
+            except Exception as e:
+                print(f"Verwerken na flush mislukt: {e}")
@@ -19,8 +19,21 @@ sys.path.insert(0, BASE_DIR)
 from scripts.gui_view import start_gui
 from scripts.screen.tft_ui import TFTUI
 
-from scripts.sensors import read_moisture, read_light
+from scripts.sensors import read_moisture_sample, read_light, stop as stop_sensors
 from scripts.moisture_led_status import setup_leds, set_leds_by_raw
+from scripts.reporting import ReportPolicy
+
+# Cloud uplink (uplink.py staat in de root van de repo)
+REPO_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "..", ".."))
+sys.path.append(REPO_DIR)
+RENDER_URL = os.environ.get("SMARTWORLD_URL", "https://smartworld-nbyf.onrender.com")
+UPLINK_SPOOL = os.path.join(BASE_DIR, "uplink_spool.db")
+# Toestand van de circuit breaker zoals op het scherm
+UPLINK_TEXT = {"closed": "online", "open": "offline (spool)", "half_open": "verbinden..."}
+try:
+    from uplink import Uplink
+except Exception:
+    Uplink = None   # geen cloud: lokaal werkt alles gewoon door
 
 
 try:
@@ -45,12 +58,29 @@ class Controller:
             "moisture_led": "UNKNOWN",
             "light": None,
             "servo_text": servo_status(),
+            "uplink": "uit" if Uplink is None else UPLINK_TEXT["closed"],
         }
+
+        # Alleen veranderingen (deadband), heartbeats en events gaan naar de cloud
+        self.report_policy = ReportPolicy()
+        self.uplink = None
+        if Uplink is not None:
+            # Bij een dode API stopt de breaker de pogingen; metingen gaan naar de spool
+            self.uplink = Uplink(RENDER_URL, spool_path=UPLINK_SPOOL, compress=True,
+                                 on_breaker=self._on_uplink_state)
+            self.uplink.start()
+
     def set_awake(self, is_awake: bool):
         with self._lock:
             self.state["ui_awake"] = bool(is_awake)
         self._notify()
 
+    def _on_uplink_state(self, breaker_state):
+        # Aangeroepen vanuit de uplink-thread
+        with self._lock:
+            self.state["uplink"] = UPLINK_TEXT.get(breaker_state, breaker_state)
+        self._notify()
+
     def add_observer(self, fn):
         self._observers.append(fn)
 
@@ -78,7 +108,9 @@ class Controller:
             self._notify()
 
     def refresh_moisture(self, force_notify=False):
-        p, raw = read_moisture()
+        sample = read_moisture_sample()
+        # Zonder meting toont de UI de fail-safe 0, maar die gaat niet naar de cloud
+        p, raw = sample if sample is not None else (0, 0)
         led = set_leds_by_raw(raw)
 
 
@@ -98,9 +130,22 @@ class Controller:
             self.state["moisture_raw"] = raw
             self.state["moisture_led"] = led
 
+        if sample is not None:
+            self._report(p)
+
         if changed:
             self._notify()
 
+    def _report(self, moisture_percent, water_given=False):
+        with self._lock:
+            light = self.state["light"]
+        values = {"bodemvocht": moisture_percent, "licht": light}
+        if self.report_policy.offer(values, event=water_given) is None:
+            return
+        if self.uplink is not None:
+            # licht None (read_light() nog niet gekoppeld) gaat als "geen meting", niet als 0
+            self.uplink.send(licht=light, bodemvocht=moisture_percent, water_gegeven=water_given)
+
     def refresh_light(self, force_notify=False):
         val = read_light()
         with self._lock:
@@ -113,6 +158,10 @@ class Controller:
             msg = open_kraan()
             with self._lock:
                 self.state["servo_text"] = msg
+                p = self.state["moisture_percent"]
+            # Water geven altijd meteen melden, los van de deadband
+            if p is not None:
+                self._report(p, water_given=True)
             self._notify()
         threading.Thread(target=job, daemon=True).start()
 
@@ -157,3 +206,6 @@ if __name__ == "__main__":
 
     c.goto("menu")
     root.mainloop()
+    stop_sensors()
+    if c.uplink is not None:
+        c.uplink.stop()
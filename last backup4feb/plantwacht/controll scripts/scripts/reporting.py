@@ -0,0 +1,90 @@
+import threading
+import time
+
+# Per signaal: pas opnieuw melden als de waarde minstens zoveel veranderd is
+# t.o.v. de laatst GEMELDE waarde (dus langzame drift komt er ook door)
+DEADBANDS = {
+    "bodemvocht": 1.0,      # procent
+    "licht": 5.0,
+}
+HEARTBEAT_S = 600           # hoe dan ook een meting na zoveel sec stilte
+MIN_INTERVAL_S = 5          # nooit vaker dan dit (behalve events)
+CONFIRM_S = 10              # zo lang aaneengesloten buiten de deadband (tegen flikkeren)
+
+
+class ReportPolicy:
+    """
+    Beslist welke metingen naar de cloud gaan: alleen bij een echte
+    verandering (deadband), een heartbeat na lange stilte, of meteen bij
+    een event (water gegeven).
+    """
+
+    def __init__(self, deadbands=None, heartbeat_s=HEARTBEAT_S, min_interval_s=MIN_INTERVAL_S,
+                 confirm_s=CONFIRM_S):
+        self.deadbands = dict(DEADBANDS if deadbands is None else deadbands)
+        self.heartbeat_s = heartbeat_s
+        self.min_interval_s = min_interval_s
+        self.confirm_s = confirm_s
+        self._outside_since = None  # sinds wanneer aaneengesloten buiten de deadband
+        self._lock = threading.Lock()
+        self._last = {}             # signaal -> laatst gemelde waarde
+        self._last_time = None
+        self.offered = 0
+        self.reported = 0
+        self.reasons = {"event": 0, "deadband": 0, "heartbeat": 0, "first": 0}
+
+    def offer(self, values, event=False, now=None):
+        """
+        values: dict signaal -> waarde. Geeft de reden terug als deze meting
+        gemeld moet worden ("event", "deadband", "heartbeat", "first"), anders None.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.offered += 1
+            reason = self._reason(values, event, now)
+            if reason is None:
+                return None
+            self._last.update({k: v for k, v in values.items() if v is not None})
+            self._last_time = now
+            self._outside_since = None
+            self.reported += 1
+            self.reasons[reason] += 1
+            return reason
+
+    def _reason(self, values, event, now):
+        if event:
+            return "event"
+        if self._last_time is None:
+            return "first"
+        since = now - self._last_time
+        if since >= self.heartbeat_s:
+            return "heartbeat"
+
+        if not self._outside_deadband(values):
+            self._outside_since = None
+            return None
+        if self._outside_since is None:
+            self._outside_since = now
+        # Een waarde die op de grens heen en weer springt (49/50) telt niet
+        if now - self._outside_since >= self.confirm_s and since >= self.min_interval_s:
+            return "deadband"
+        return None
+
+    def _outside_deadband(self, values):
+        for signal, band in self.deadbands.items():
+            value = values.get(signal)
+            if value is None:
+                continue
+            last = self._last.get(signal)
+            if last is None or abs(value - last) >= band:
+                return True
+        return False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "offered": self.offered,
+                "reported": self.reported,
+                "reduction": round(self.offered / self.reported, 1) if self.reported else None,
+                "reasons": dict(self.reasons),
+            }
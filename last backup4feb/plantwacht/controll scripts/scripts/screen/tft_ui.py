@@ -324,6 +324,7 @@ class TFTUI(threading.Thread):
             st.get("moisture_raw"),
             st.get("light"),
             st.get("servo_text"),
+            st.get("uplink"),
         )
 
         if key == self._last_key:
@@ -331,7 +332,7 @@ class TFTUI(threading.Thread):
         self._last_key = key
 
         if screen_id == "menu":
-            return self._draw_menu()
+            return self._draw_menu(status_text=f"Cloud: {st.get('uplink', '-')}")
         return self._draw_page(screen_id, st)
 
     def run(self):
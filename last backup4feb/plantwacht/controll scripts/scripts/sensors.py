@@ -1,11 +1,12 @@
+import os
+import sys
 import time
 from collections import deque
 from statistics import median
 
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+# adc_sampler.py en i2c_bus.py staan in de root van de repo
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
+from adc_sampler import ScanScheduler
 
 # VASTE KALIBRATIE (jouw waarden)
 DRY   = 4837
@@ -13,37 +14,57 @@ MOIST = 4939
 WET   = 5274
 
 # ===== Snelle sample per tick =====
-SAMPLES = 15            # snel genoeg
-DELAY = 0.001           # klein (I2C call kost al tijd)
+# ADS in continuous mode: een burst van 32 samples op 860 SPS duurt ~40 ms
+# (eerder 15 single-shot conversies van elk ~8 ms plus I2C overhead)
+SAMPLES = 32
+DATA_RATE = 860
+RDY_PIN = None          # BCM pin aan ALERT/RDY van de ADS; None = timed polling
+
+# ===== Scan-tempo per kanaal =====
+MOISTURE_PIN = 0        # A0
+MOISTURE_HZ = 2.0
+LIGHT_PIN = None        # A2 als de lichtsensor aangesloten is (zoals in Plant5)
+LIGHT_HZ = 0.5
+FIRST_SAMPLE_WAIT = 1.0 # sec: bij het opstarten op de eerste meting wachten
+MAX_SAMPLE_AGE = 10.0   # sec: oudere laatste meting = sensor/bus kapot, geen waarde
 
 # ===== Stabiliteit over tijd =====
-HISTORY_N = 9           # rolling median -> stabiel maar responsief
+HISTORY_N = 9           # rolling median over de laatste HISTORY_N scans (~4.5 s)
 _raw_hist = deque(maxlen=HISTORY_N)
 
-# ADC init
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-ads.gain = 1
-ch0 = AnalogIn(ads, 0)  # A0
+# Alleen de scan-thread komt aan de ADC (gedeelde bus, i2c_bus.py); de rest
+# leest de laatst gepubliceerde meting
+_channels = [{"name": "bodemvocht", "pin": MOISTURE_PIN, "rate_hz": MOISTURE_HZ}]
+if LIGHT_PIN is not None:
+    _channels.append({"name": "licht", "pin": LIGHT_PIN, "rate_hz": LIGHT_HZ})
+scan = ScanScheduler(_channels, data_rate=DATA_RATE, samples=SAMPLES, rdy_pin=RDY_PIN)
 
 
-def clamp(x, lo=0, hi=100):
-    return max(lo, min(hi, x))
+def _on_sample(sample):
+    if sample["name"] == "bodemvocht":
+        _raw_hist.append(sample["raw"])
 
 
-def _read_raw_fast():
-    vals = []
-    for _ in range(SAMPLES):
-        try:
-            vals.append(int(ch0.value))
-        except Exception:
-            pass
-        time.sleep(DELAY)
+scan.subscribe(_on_sample)
+
+
+def start():
+    """Start de scan-thread (mag vaker)."""
+    scan.start()
 
-    if not vals:
-        return None
 
-    return int(median(vals))
+def stop():
+    scan.stop()
+
+
+def clamp(x, lo=0, hi=100):
+    return max(lo, min(hi, x))
+
+
+def last_burst():
+    """Statistiek van de laatste bodemvocht-burst (n, median, mean, stdev, min, max, duration_s) of None."""
+    sample = scan.latest("bodemvocht")
+    return sample["burst"] if sample else None
 
 
 def _piecewise_percent(raw, dry, moist, wet):
@@ -65,27 +86,34 @@ def _piecewise_percent(raw, dry, moist, wet):
     return 0
 
 
-def read_moisture():
+def read_moisture_sample():
     """
-    Returns: (percent, raw_stable)
+    Returns: (percent, raw_stable), of None zonder verse meting (net
+    opgestart of sensor kapot).
     raw_stable = rolling median over de laatste HISTORY_N metingen.
+    Raakt de bus niet: leest wat de scan-thread gepubliceerd heeft.
     """
-    raw_fast = _read_raw_fast()
-
-    if raw_fast is None:
-        # fail-safe
-        if _raw_hist:
-            raw_stable = int(median(_raw_hist))
-            pct = clamp(_piecewise_percent(raw_stable, DRY, MOIST, WET))
-            return pct, raw_stable
-        return 0, 0
+    start()
+    # Net opgestart: even op de eerste meting wachten
+    sample = scan.latest("bodemvocht", wait=FIRST_SAMPLE_WAIT)
+    hist = list(_raw_hist)
 
-    _raw_hist.append(raw_fast)
+    if sample is None or not hist or time.time() - sample["timestamp"] > MAX_SAMPLE_AGE:
+        return None
 
-    raw_stable = int(median(_raw_hist))  # super stabiel, maar niet traag
+    raw_stable = int(median(hist))  # super stabiel, maar niet traag
     pct = clamp(_piecewise_percent(raw_stable, DRY, MOIST, WET))
     return pct, raw_stable
 
 
+def read_moisture():
+    """Returns: (percent, raw_stable); fail-safe (0, 0) zonder meting (alleen voor de UI)."""
+    return read_moisture_sample() or (0, 0)
+
+
 def read_light():
-    return None  # skip
+    if LIGHT_PIN is None:
+        return None  # skip
+    start()
+    sample = scan.latest("licht", wait=FIRST_SAMPLE_WAIT)
+    return sample["raw"] if sample else None
@@ -1,18 +1,21 @@
+import os
+import sys
 import time
-from statistics import mean
 import RPi.GPIO as GPIO
 
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+# adc_sampler.py en i2c_bus.py staan in de root van de repo
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
+from adc_sampler import BurstSampler
+from i2c_bus import channel
 
 LED_GREEN = 16
 LED_YELLOW = 20
 LED_RED = 21
 
-SAMPLES = 40
-DELAY = 0.02
+# Burst in continuous mode: 128 samples op 860 SPS in ~0.15 s (was 40 x 20 ms = 0.8 s).
+# Een sample op 860 SPS is wat ruisiger, meer samples compenseren dat.
+SAMPLES = 128
+DATA_RATE = 860
 
 GREEN_FROM = 70
 YELLOW_FROM = 35
@@ -21,6 +24,10 @@ YELLOW_FROM = 35
 DRY_SNAP_MARGIN = 15     # raw dichtbij DRY binnen marge
 DRY_SNAP_SECONDS = 3.0   # zo lang dichtbij dry -> force 0%
 
+# burst() geeft None bij een I2C fout; zo vaak opnieuw proberen
+READ_RETRIES = 3
+RETRY_DELAY = 0.2
+
 def clamp(x, lo=0, hi=100):
     return max(lo, min(hi, x))
 
@@ -35,12 +42,23 @@ def set_leds(pct):
         GPIO.output(LED_GREEN, False); GPIO.output(LED_YELLOW, False); GPIO.output(LED_RED, True)
         return "RED"
 
-def read_avg(ch):
-    vals = []
-    for _ in range(SAMPLES):
-        vals.append(ch.value)
-        time.sleep(DELAY)
-    return int(mean(vals))
+def read_avg(sampler):
+    """Gemiddelde raw waarde van een burst, of None als de ADC blijft falen."""
+    for _ in range(READ_RETRIES):
+        burst = sampler.burst(SAMPLES)
+        if burst is not None:
+            return int(burst["mean"])
+        time.sleep(RETRY_DELAY)
+    print(f"FOUT: ADC leest niet (I2C fout, {READ_RETRIES}x geprobeerd). Check bedrading en adres van de ADS1115.")
+    return None
+
+def calibrate_point(sampler, prompt, name):
+    input(prompt)
+    raw = read_avg(sampler)
+    if raw is None:
+        sys.exit(f"Kalibratie afgebroken: geen meting voor {name}.")
+    print(f"{name} avg_raw = {raw}")
+    return raw
 
 def piecewise_percent(raw, dry, moist, wet):
     pts = [(dry, 0), (moist, 50), (wet, 100)]
@@ -66,27 +84,16 @@ def main():
     GPIO.setup(LED_YELLOW, GPIO.OUT)
     GPIO.setup(LED_RED, GPIO.OUT)
 
-    i2c = busio.I2C(board.SCL, board.SDA)
-    ads = ADS.ADS1115(i2c)
-    ads.gain = 1
-    ch = AnalogIn(ads, 0)
+    ch = BurstSampler(channel(0), data_rate=DATA_RATE)
 
     print("\n=== 3-PUNTS KALIBRATIE (DEMO) v2 ===")
     print("BELANGRIJK:")
     print("- Gebruik voor DRY: NIEUW kurkdroog papier (of zonder papier).")
     print("- Als je zoutwater gebruikt: sensor/papier blijft geleidend -> pak nieuw papier.\n")
 
-    input("1) DROOG: druk ENTER...")
-    dry = read_avg(ch)
-    print(f"DRY avg_raw = {dry}")
-
-    input("2) HALF-NAT (YELLOW): licht vochtig. ENTER...")
-    moist = read_avg(ch)
-    print(f"MOIST avg_raw = {moist}")
-
-    input("3) NAT (GREEN): doorweekt/in water. ENTER...")
-    wet = read_avg(ch)
-    print(f"WET avg_raw = {wet}")
+    dry = calibrate_point(ch, "1) DROOG: druk ENTER...", "DRY")
+    moist = calibrate_point(ch, "2) HALF-NAT (YELLOW): licht vochtig. ENTER...", "MOIST")
+    wet = calibrate_point(ch, "3) NAT (GREEN): doorweekt/in water. ENTER...", "WET")
 
     span = max(dry, moist, wet) - min(dry, moist, wet)
     if span < 200:
@@ -102,6 +109,10 @@ def main():
     try:
         while True:
             raw = read_avg(ch)
+            if raw is None:
+                # LEDs laten staan; volgende ronde opnieuw
+                time.sleep(1.0)
+                continue
             pct = clamp(piecewise_percent(raw, dry, moist, wet))
 
             # Snap back to dry (voorkomt 'blijft geel hangen')
@@ -0,0 +1,144 @@
+import json
+import os
+import uuid
+
+# Optioneel: met Redis delen alle workers dezelfde laatste waarden
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+LATEST_CACHE_REDIS_URL = os.environ.get('LATEST_CACHE_REDIS_URL')
+
+
+def _as_dict(row):
+    return {
+        "device_id": row["device_id"],
+        "plant_id": row["plant_id"],
+        "timestamp": row["timestamp"].isoformat(),
+        "licht": row["licht"],
+        "bodemvocht": row["bodemvocht"],
+        "water_gegeven": row["water_gegeven"],
+    }
+
+
+class LatestCache:
+    """
+    Laatste meting per apparaat, in het geheugen van dit proces.
+    ETags bevatten een boot-id, zodat een herstart nooit een oude ETag matcht.
+    """
+
+    def __init__(self):
+        self._boot = uuid.uuid4().hex[:8]
+        self._latest = {}           # device_id -> dict
+        self._versions = {}         # device_id -> int
+        self._version = 0
+
+    async def update(self, rows):
+        for row in rows:
+            reading = _as_dict(row)
+            device = reading["device_id"]
+            current = self._latest.get(device)
+            # Een late (gebufferde) meting mag een nieuwere niet overschrijven
+            if current is not None and current["timestamp"] >= reading["timestamp"]:
+                continue
+            self._latest[device] = reading
+            self._versions[device] = self._versions.get(device, 0) + 1
+            self._version += 1
+
+    async def get_all(self):
+        return f'"{self._boot}-{self._version}"', dict(self._latest)
+
+    async def get(self, device):
+        if device not in self._latest:
+            return None, None
+        return f'"{self._boot}-{device}-{self._versions[device]}"', self._latest[device]
+
+    async def close(self):
+        pass
+
+
+# Zet alleen als de meting nieuwer is dan wat er al staat (atomair in Redis)
+_SET_IF_NEWER = """
+local cur = redis.call('HGET', KEYS[1], ARGV[1])
+if cur and cjson.decode(cur)['timestamp'] >= ARGV[3] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+redis.call('INCR', KEYS[3])
+return 1
+"""
+
+
+class RedisLatestCache:
+    """Zelfde interface als LatestCache, maar gedeeld via een Redis hash."""
+
+    KEY_LATEST = "smartworld:latest"
+    KEY_VERSIONS = "smartworld:latest:versions"
+    KEY_VERSION = "smartworld:latest:version"
+
+    def __init__(self, url):
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._set_if_newer = self._redis.register_script(_SET_IF_NEWER)
+
+    async def update(self, rows):
+        # Alleen de nieuwste per apparaat hoeft naar Redis
+        newest = {}
+        for row in rows:
+            reading = _as_dict(row)
+            current = newest.get(reading["device_id"])
+            if current is None or reading["timestamp"] > current["timestamp"]:
+                newest[reading["device_id"]] = reading
+        for device, reading in newest.items():
+            await self._set_if_newer(
+                keys=[self.KEY_LATEST, self.KEY_VERSIONS, self.KEY_VERSION],
+                args=[device, json.dumps(reading), reading["timestamp"]],
+            )
+
+    async def get_all(self):
+        pipe = self._redis.pipeline()
+        pipe.get(self.KEY_VERSION)
+        pipe.hgetall(self.KEY_LATEST)
+        version, latest = await pipe.execute()
+        return f'"r-{version or 0}"', {d: json.loads(v) for d, v in latest.items()}
+
+    async def get(self, device):
+        pipe = self._redis.pipeline()
+        pipe.hget(self.KEY_VERSIONS, device)
+        pipe.hget(self.KEY_LATEST, device)
+        version, reading = await pipe.execute()
+        if reading is None:
+            return None, None
+        return f'"r-{device}-{version}"', json.loads(reading)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_latest_cache():
+    if LATEST_CACHE_REDIS_URL:
+        if aioredis is None:
+            print("LATEST_CACHE_REDIS_URL gezet maar redis is niet geinstalleerd; cache blijft lokaal")
+        else:
+            return RedisLatestCache(LATEST_CACHE_REDIS_URL)
+    return LatestCache()
+
+
+def load_latest(conn):
+    """Laatste meting per bekend apparaat, om de cache na een (her)start te vullen."""
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT s.timestamp, s.device_id, s.plant_id, s.licht, s.bodemvocht, s.water_gegeven
+        FROM devices d
+        CROSS JOIN LATERAL (
+            SELECT * FROM sensor_data
+            WHERE device_id = d.device_id
+            ORDER BY timestamp DESC
+            LIMIT 1
+        ) s
+    ''')
+    cols = [c.name for c in cur.description]
+    rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+    cur.close()
+    return rows
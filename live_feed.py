@@ -0,0 +1,122 @@
+import asyncio
+import json
+from collections import deque
+
+
+class HubFull(Exception):
+    """Te veel open live-verbindingen."""
+
+
+class Subscriber:
+    """Een open live-verbinding met een eigen, begrensde wachtrij."""
+
+    def __init__(self, device, max_pending, max_drops):
+        self.device = device
+        self.max_pending = max_pending
+        self.max_drops = max_drops
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.dropped_since_drain = 0
+        self.closed = False
+
+    def push(self, message):
+        if len(self.pending) >= self.max_pending:
+            # Trage client: oudste bericht weg, niet de hele server ophouden
+            self.pending.popleft()
+            self.dropped += 1
+            self.dropped_since_drain += 1
+            if self.dropped_since_drain > self.max_drops:
+                self.closed = True
+        self.pending.append(message)
+        self.ready.set()
+
+    async def drain(self, timeout):
+        """Wacht op nieuwe berichten en geeft ze allemaal tegelijk terug ([] bij timeout)."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        messages = list(self.pending)
+        self.pending.clear()
+        self.dropped_since_drain = 0
+        return messages
+
+
+class LiveHub:
+    """
+    In-process pub/sub: elke nieuwe meting wordt een keer naar JSON gezet
+    en dan naar alle abonnees (alles, of alleen hun apparaat) verdeeld.
+    Alles draait op de event loop, dus er zijn geen locks nodig.
+    """
+
+    def __init__(self, max_subscribers=200, max_pending=100, max_drops=500):
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.max_drops = max_drops
+        self._all = set()           # abonnees op alle apparaten
+        self._by_device = {}        # device_id -> set van abonnees
+        self.published = 0
+        self.disconnected_slow = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._all) + sum(len(s) for s in self._by_device.values())
+
+    def subscribe(self, device=None):
+        if self.subscriber_count >= self.max_subscribers:
+            raise HubFull(f"maximaal {self.max_subscribers} live-verbindingen")
+        sub = Subscriber(device, self.max_pending, self.max_drops)
+        if device is None:
+            self._all.add(sub)
+        else:
+            self._by_device.setdefault(device, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub.device is None:
+            self._all.discard(sub)
+        else:
+            subs = self._by_device.get(sub.device)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_device[sub.device]
+
+    def publish(self, rows):
+        for row in rows:
+            targets = self._by_device.get(row["device_id"])
+            if not self._all and not targets:
+                continue
+            data = json.dumps({
+                "device_id": row["device_id"],
+                "plant_id": row["plant_id"],
+                "timestamp": row["timestamp"].isoformat(),
+                "licht": row["licht"],
+                "bodemvocht": row["bodemvocht"],
+                "water_gegeven": row["water_gegeven"],
+            })
+            self.published += 1
+            self._send(f"event: reading\ndata: {data}\n\n", targets)
+
+    def publish_alert(self, alert):
+        """Een melding van de alert engine, als 'event: alert'."""
+        targets = self._by_device.get(alert["device_id"])
+        if self._all or targets:
+            self._send(f"event: alert\ndata: {json.dumps(alert)}\n\n", targets)
+
+    def _send(self, message, targets):
+        for sub in list(self._all) + list(targets or ()):
+            sub.push(message)
+            if sub.closed:
+                self.unsubscribe(sub)
+                self.disconnected_slow += 1
+                sub.ready.set()     # wakker maken zodat de stream stopt
+
+    def snapshot(self):
+        return {
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+        }
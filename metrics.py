@@ -0,0 +1,204 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Kleine, afhankelijkheidsvrije Prometheus metrics.
+#
+# Elke thread schrijft in zijn eigen "shard" (threading.local), dus het
+# meten zelf neemt geen lock; alleen /metrics telt de shards bij elkaar op.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+
+
+class _Sharded:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Een keer per thread, daarna nooit meer een lock
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def _label_str(self, values, extra=None):
+        pairs = list(zip(self.labels, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return [f"{self.name}{self._label_str(k)} {v}" for k, v in sorted(totals.items())]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        entry = shard.get(label_values)
+        if entry is None:
+            entry = shard[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshots():
+            for key, (counts, total) in shard.items():
+                acc = totals.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                for i, c in enumerate(counts):
+                    acc[0][i] += c
+                acc[1] += total
+
+        lines = []
+        for key, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{self._label_str(key, ('le', bound))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._label_str(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Waarde die pas bij het uitlezen wordt opgevraagd (fn). None = (nog) geen waarde."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        _registry.append(self)
+
+    def collect(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [] if value is None else [f"{self.name} {value}"]
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, *self.label_values)
+
+
+def render():
+    """Alle metrics in Prometheus tekstformaat."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: latency per route (route-sjabloon, niet het echte pad).
+    Een 503 van een probe-route (bv. /ready tijdens het opwarmen) is een
+    antwoord en geen fout; die telt niet mee in http_5xx.
+    """
+
+    def __init__(self, app, probe_routes=()):
+        self.app = app
+        self.probe_routes = frozenset(probe_routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "onbekend")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], path, status[0])
+            if status[0] >= 500 and path not in self.probe_routes:
+                ERRORS.inc("http_5xx")
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "smartworld_http_request_duration_seconds", "Duur van HTTP requests per route",
+    labels=("method", "route", "status"),
+)
+DB_SECONDS = Histogram(
+    "smartworld_db_seconds", "Tijd van database stappen (execute, commit)",
+    labels=("step",),
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "smartworld_db_pool_wait_seconds", "Wachttijd om een verbinding uit de pool te lenen",
+)
+ROWS_INGESTED = Counter(
+    "smartworld_rows_ingested_total", "Weggeschreven metingen per apparaat",
+    labels=("device_id",),
+)
+ERRORS = Counter(
+    "smartworld_errors_total", "Fouten per soort",
+    labels=("kind",),
+)
@@ -0,0 +1,130 @@
+"""
+Versiebeheer van het databaseschema.
+
+Elke migratie heeft een vast versienummer en draait precies een keer;
+schema_migrations onthoudt wat er al gedaan is. Draai dit bij de deploy
+(Render: Pre-Deploy Command), niet bij elke start van de API:
+
+    python migrations.py            # openstaande migraties uitvoeren
+    python migrations.py --status   # alleen laten zien wat er openstaat
+
+Een nieuwe migratie = een functie met (cur) en een regel onderaan MIGRATIONS.
+Nooit een bestaande versie aanpassen of hernummeren.
+"""
+import sys
+import time
+
+from partitions import setup_partitioned_table
+from rollups import setup_rollups, add_value_counts
+
+# Zelfde soort vaste sleutel als in partitions.py, maar een eigen lock
+_MIGRATE_LOCK_KEY = 7311002
+
+_VERSION_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT now(),
+        duration_ms INT
+    )
+'''
+
+
+def _sensor_data(conn):
+    setup_partitioned_table(conn)
+
+
+def _rollups(conn):
+    setup_rollups(conn)
+
+
+def _rollup_counts(conn):
+    add_value_counts(conn)
+
+
+# (versie, naam, functie(conn)). De functie mag zelf committen; na afloop
+# wordt de versie in dezelfde sessie vastgelegd.
+MIGRATIONS = [
+    (1, "sensor_data gepartitioneerd + devices", _sensor_data),
+    (2, "rollups per minuut/uur/dag", _rollups),
+    (3, "rollups: aantal metingen per waarde (licht mag ontbreken)", _rollup_counts),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Hoogste uitgevoerde versie (0 als er nog niets is gemigreerd)."""
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('schema_migrations')")
+    if cur.fetchone()[0] is None:
+        cur.close()
+        return 0
+    cur.execute("SELECT COALESCE(max(version), 0) FROM schema_migrations")
+    version = cur.fetchone()[0]
+    cur.close()
+    return version
+
+
+def pending(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def migrate(conn, log=print):
+    """
+    Voert alle openstaande migraties uit. Meerdere workers of deploys
+    tegelijk wachten op elkaar via een advisory lock.
+    Geeft de lijst met uitgevoerde versies terug.
+    """
+    cur = conn.cursor()
+    cur.execute(_VERSION_TABLE_DDL)
+    conn.commit()
+
+    # Sessie-lock: de migraties committen zelf tussendoor
+    cur.execute("SELECT pg_advisory_lock(%s)", (_MIGRATE_LOCK_KEY,))
+    applied = []
+    try:
+        for version, name, fn in pending(conn):
+            t0 = time.perf_counter()
+            log(f"Migratie {version}: {name} ...")
+            fn(conn)
+            duration_ms = int((time.perf_counter() - t0) * 1000)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                (version, name, duration_ms)
+            )
+            conn.commit()
+            applied.append(version)
+            log(f"Migratie {version} klaar in {duration_ms} ms")
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATE_LOCK_KEY,))
+        conn.commit()
+        cur.close()
+    return applied
+
+
+def main():
+    import psycopg2
+    from database import DATABASE_URL, DB_CONNECT_TIMEOUT
+
+    if not DATABASE_URL:
+        raise SystemExit("DATABASE_URL is niet gezet")
+    conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+    try:
+        if "--status" in sys.argv[1:]:
+            todo = pending(conn)
+            print(f"Schema versie {current_version(conn)}, nieuwste {LATEST_VERSION}")
+            for version, name, _fn in todo:
+                print(f"  open: {version} {name}")
+            conn.rollback()
+            return
+        applied = migrate(conn)
+        print(f"{len(applied)} migratie(s) uitgevoerd, schema versie {LATEST_VERSION}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+# sensor_data is per dag gepartitioneerd op timestamp:
+#   sensor_data_p20260101  FOR VALUES FROM ('2026-01-01') TO ('2026-01-02')
+PARTITION_PREFIX = "sensor_data_p"
+
+# Hoeveel dagen vooruit er al partities klaarstaan
+PARTITION_DAYS_AHEAD = int(os.environ.get('PARTITION_DAYS_AHEAD', '7'))
+# Ruwe metingen ouder dan dit aantal dagen gaan uit sensor_data (0 = bewaren);
+# de rollups blijven, zie retention.py
+SENSOR_RETENTION_DAYS = int(os.environ.get('SENSOR_RETENTION_DAYS', '0'))
+
+# Willekeurige vaste sleutel zodat workers niet tegelijk DDL draaien
+_DDL_LOCK_KEY = 7311001
+
+_known = set()
+_known_lock = threading.Lock()
+
+SENSOR_DATA_DDL = '''
+    CREATE TABLE IF NOT EXISTS sensor_data (
+        id BIGSERIAL,
+        timestamp TIMESTAMP NOT NULL,
+        device_id TEXT NOT NULL DEFAULT 'default',
+        plant_id TEXT,
+        licht FLOAT,
+        bodemvocht FLOAT,
+        water_gegeven BOOLEAN,
+        seq BIGINT,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+
+    -- Tabellen van voor de multi-device versie krijgen de kolommen erbij
+    ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS device_id TEXT NOT NULL DEFAULT 'default';
+    ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS plant_id TEXT;
+    ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS seq BIGINT;
+
+    -- Append-only tijdreeks: BRIN is piepklein en genoeg voor tijdsvensters
+    CREATE INDEX IF NOT EXISTS sensor_data_timestamp_brin
+        ON sensor_data USING brin (timestamp) WITH (pages_per_range = 32);
+    -- Per apparaat: B-tree zodat een apparaat opzoeken O(log n) blijft
+    CREATE INDEX IF NOT EXISTS sensor_data_device_timestamp
+        ON sensor_data (device_id, timestamp);
+    -- Idempotente ingest: dezelfde (apparaat, seq, tijd) komt er maar een keer in.
+    -- timestamp moet erin omdat het de partitiesleutel is.
+    CREATE UNIQUE INDEX IF NOT EXISTS sensor_data_device_seq
+        ON sensor_data (device_id, seq, timestamp) WHERE seq IS NOT NULL;
+
+    -- Register van alle apparaten (Raspberry Pi's) die ooit iets stuurden
+    CREATE TABLE IF NOT EXISTS devices (
+        device_id TEXT PRIMARY KEY,
+        plant_id TEXT,
+        first_seen TIMESTAMP,
+        last_seen TIMESTAMP
+    );
+'''
+
+
+def partition_name(day):
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _create_partition(cur, day):
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF sensor_data "
+        "FOR VALUES FROM (%s) TO (%s)",
+        (day, day + timedelta(days=1))
+    )
+
+
+def ensure_partitions(conn, days):
+    """
+    Zorgt dat er voor elke dag een partitie is. Wordt voor elke insert
+    aangeroepen, dus bekende dagen kosten alleen een set-lookup.
+    """
+    with _known_lock:
+        missing = sorted(set(days) - _known)
+    if not missing:
+        return
+
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (_DDL_LOCK_KEY,))
+    for day in missing:
+        _create_partition(cur, day)
+    # Eigen korte transactie: de DDL lock niet vasthouden tijdens de insert
+    conn.commit()
+    cur.close()
+
+    with _known_lock:
+        _known.update(missing)
+
+
+def create_future_partitions(conn, days_ahead=PARTITION_DAYS_AHEAD):
+    today = date.today()
+    ensure_partitions(conn, [today + timedelta(days=i) for i in range(days_ahead + 1)])
+
+
+def list_partitions(conn):
+    """Geeft [(dag, naam)] van alle bestaande dagpartities, oud naar nieuw."""
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'sensor_data'::regclass
+    ''')
+    result = []
+    for (name,) in cur.fetchall():
+        if name.startswith(PARTITION_PREFIX):
+            try:
+                day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+            except ValueError:
+                continue
+            result.append((day, name))
+    cur.close()
+    return sorted(result)
+
+
+def retention_cutoff(retention_days=SENSOR_RETENTION_DAYS):
+    """Eerste dag die nog bewaard wordt (None als retentie uit staat)."""
+    if retention_days <= 0:
+        return None
+    return date.today() - timedelta(days=retention_days)
+
+
+def expired_partitions(conn, retention_days=SENSOR_RETENTION_DAYS):
+    """Dagpartities die ouder zijn dan retention_days ([] als retentie uit staat)."""
+    cutoff = retention_cutoff(retention_days)
+    if cutoff is None:
+        return []
+    return [(day, name) for day, name in list_partitions(conn) if day < cutoff]
+
+
+def drop_partition(cur, day, name):
+    """Retentie = hele dagpartities weggooien, geen grote DELETE. Commit doet de aanroeper."""
+    cur.execute(f"DROP TABLE IF EXISTS {name}")
+    with _known_lock:
+        _known.discard(day)
+
+
+def setup_partitioned_table(conn):
+    """
+    Maakt de gepartitioneerde sensor_data aan. Een oude, gewone tabel
+    (van voor de partitionering) wordt een keer omgezet.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (_DDL_LOCK_KEY,))
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('sensor_data')")
+    row = cur.fetchone()
+    legacy = row is not None and row[0] == 'r'
+    cur.execute("SELECT to_regclass('devices')")
+    new_registry = cur.fetchone()[0] is None
+
+    if legacy:
+        cur.execute("ALTER TABLE sensor_data RENAME TO sensor_data_legacy")
+        cur.execute("ALTER SEQUENCE IF EXISTS sensor_data_id_seq RENAME TO sensor_data_legacy_id_seq")
+
+    cur.execute(SENSOR_DATA_DDL)
+
+    if legacy:
+        cur.execute("SELECT DISTINCT timestamp::date FROM sensor_data_legacy WHERE timestamp IS NOT NULL")
+        for (day,) in cur.fetchall():
+            _create_partition(cur, day)
+        cur.execute('''
+            INSERT INTO sensor_data (id, timestamp, licht, bodemvocht, water_gegeven)
+            SELECT id, timestamp, licht, bodemvocht, water_gegeven
+            FROM sensor_data_legacy
+            WHERE timestamp IS NOT NULL
+        ''')
+        cur.execute("SELECT setval('sensor_data_id_seq', GREATEST((SELECT max(id) FROM sensor_data), 1))")
+        # Zonder timestamp past een rij in geen enkele partitie: apart bewaren, niet weggooien
+        cur.execute("SELECT count(*) FROM sensor_data_legacy WHERE timestamp IS NULL")
+        no_timestamp = cur.fetchone()[0]
+        if no_timestamp:
+            cur.execute("CREATE TABLE IF NOT EXISTS sensor_data_no_timestamp (LIKE sensor_data_legacy)")
+            cur.execute("INSERT INTO sensor_data_no_timestamp SELECT * FROM sensor_data_legacy WHERE timestamp IS NULL")
+        cur.execute("SELECT count(*) FROM sensor_data")
+        print(f"Oude sensor_data omgezet: {cur.fetchone()[0]} rijen gepartitioneerd, "
+              f"{no_timestamp} zonder timestamp naar sensor_data_no_timestamp")
+        cur.execute("DROP TABLE sensor_data_legacy")
+
+    if new_registry:
+        cur.execute('''
+            INSERT INTO devices (device_id, plant_id, first_seen, last_seen)
+            SELECT device_id, max(plant_id), min(timestamp), max(timestamp)
+            FROM sensor_data
+            GROUP BY device_id
+        ''')
+
+    conn.commit()
+    cur.close()
+
+    create_future_partitions(conn)
@@ -3,6 +3,7 @@ import os, sys
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # .../plantwacht/script-van-team
 PROJECT_DIR = os.path.dirname(BASE_DIR)                 # .../plantwacht
 sys.path.insert(0, PROJECT_DIR)
+sys.path.append(os.path.dirname(PROJECT_DIR))          # repo root (i2c_bus.py)
 
 
 import tkinter as tk
@@ -11,11 +12,6 @@ import time
 import threading
 import RPi.GPIO as GPIO
 
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-
 # ✅ jouw servo functies (van scripts/servo_plantwacht.py)
 from scripts.servo_plantwacht import open_kraan, dicht_kraan, status as servo_status
 
@@ -84,16 +80,10 @@ import random
 USE_ADC = True
 
 try:
-    import board
-    import busio
-    import adafruit_ads1x15.ads1115 as ADS
-    from adafruit_ads1x15.analog_in import AnalogIn
-
-    i2c = busio.I2C(board.SCL, board.SDA)
-    ads = ADS.ADS1115(i2c)
-    ads.gain = 1
+    from i2c_bus import channel, get_ads
 
-    moisture_channel = AnalogIn(ads, ADS.P0)
+    get_ads()   # bus openen: geen ADC -> hieronder MOCK
+    moisture_channel = channel(0)
 
     WET = 12000
     DRY = 26000
@@ -0,0 +1,136 @@
+"""
+Compact binair formaat voor metingen (apparaat -> API).
+
+Frame:
+    "SW"  versie(u8)  flags(u8)
+    len(u8) device_id   len(u8) plant_id (0 = geen)
+    aantal(u16)
+    per meting (versie 2, 17 bytes):
+        tijd(u32, unix sec, 0 = nu)  seq(u32)  licht(f32)  bodemvocht(f32)  vlaggen(u8)
+    versie 1 (13 bytes) is hetzelfde zonder seq en wordt nog steeds gelezen.
+
+Vlaggen: bit 0 = water gegeven, bit 1 = seq is gezet.
+Een ontbrekende waarde (None, bv. geen lichtsensor) gaat als NaN.
+
+Alles little-endian. Een losse meting is gewoon een frame met aantal 1
+(4 + id's + 2 + 17 bytes, tegen honderden bytes als query string).
+"""
+import math
+import struct
+from datetime import datetime
+
+CONTENT_TYPE = "application/x-smartworld-reading"
+
+MAGIC = b"SW"
+VERSION = 2
+FLAG_WATER = 0x01
+FLAG_SEQ = 0x02
+
+_HEADER = struct.Struct("<2sBB")
+_COUNT = struct.Struct("<H")
+_RECORDS = {
+    1: struct.Struct("<IffB"),
+    2: struct.Struct("<IIffB"),
+}
+
+MAX_READINGS = 0xFFFF
+
+
+def _pack_str(value):
+    raw = (value or "").encode()
+    if len(raw) > 255:
+        raise ValueError("id te lang (max 255 bytes)")
+    return bytes([len(raw)]) + raw
+
+
+def _epoch(ts):
+    if ts is None:
+        return 0
+    if isinstance(ts, datetime):
+        return int(ts.timestamp())
+    return int(ts)
+
+
+def _value(v):
+    return math.nan if v is None else v
+
+
+def _missing(v):
+    return None if math.isnan(v) else v
+
+
+def encode_readings(readings, device_id="default", plant_id=None):
+    """
+    readings: lijst van dicts met licht, bodemvocht, water_gegeven en
+    optioneel timestamp (unix tijd of datetime) en seq (0..2^32-1).
+    """
+    readings = list(readings)
+    if len(readings) > MAX_READINGS:
+        raise ValueError(f"maximaal {MAX_READINGS} metingen per frame")
+
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, 0),
+        _pack_str(device_id),
+        _pack_str(plant_id),
+        _COUNT.pack(len(readings)),
+    ]
+    record = _RECORDS[VERSION]
+    for r in readings:
+        flags = FLAG_WATER if r.get("water_gegeven") else 0
+        seq = r.get("seq")
+        if seq is not None:
+            flags |= FLAG_SEQ
+        parts.append(record.pack(_epoch(r.get("timestamp")), seq or 0,
+                                 _value(r["licht"]), _value(r["bodemvocht"]), flags))
+    return b"".join(parts)
+
+
+def decode_readings(data):
+    """Geeft een lijst dicts terug (zelfde velden als de JSON batch). ValueError bij een kapot frame."""
+    view = memoryview(data)
+    if len(view) < _HEADER.size:
+        raise ValueError("frame te kort")
+    magic, version, _flags = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("geen SmartWorld frame")
+    record = _RECORDS.get(version)
+    if record is None:
+        raise ValueError(f"onbekende versie {version}")
+    pos = _HEADER.size
+
+    ids = []
+    for _ in range(2):
+        if pos >= len(view):
+            raise ValueError("frame te kort")
+        n = view[pos]
+        pos += 1
+        if pos + n > len(view):
+            raise ValueError("frame te kort")
+        ids.append(bytes(view[pos:pos + n]).decode() or None)
+        pos += n
+    device_id, plant_id = ids
+
+    if pos + _COUNT.size > len(view):
+        raise ValueError("frame te kort")
+    (count,) = _COUNT.unpack_from(view, pos)
+    pos += _COUNT.size
+    if len(view) - pos != count * record.size:
+        raise ValueError(f"verwacht {count} metingen van {record.size} bytes")
+
+    readings = []
+    for values in record.iter_unpack(view[pos:]):
+        if version == 1:
+            ts, licht, bodemvocht, flags = values
+            seq = None
+        else:
+            ts, seq, licht, bodemvocht, flags = values
+        readings.append({
+            "timestamp": datetime.fromtimestamp(ts) if ts else None,
+            "seq": seq if flags & FLAG_SEQ else None,
+            "device_id": device_id or "default",
+            "plant_id": plant_id,
+            "licht": _missing(licht),
+            "bodemvocht": _missing(bodemvocht),
+            "water_gegeven": bool(flags & FLAG_WATER),
+        })
+    return readings
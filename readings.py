@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+import math
+import re
+import zlib
+from datetime import timedelta
+
+from rollups import rollup_for_bucket, query_rollup
+
+# "Mooie" bucketgroottes in seconden; de gekozen bucket wordt naar boven
+# afgerond op een van deze, zodat grafieken op hele minuten/uren vallen.
+NICE_BUCKETS = [
+    1, 5, 10, 15, 30,
+    60, 120, 300, 600, 900, 1800,
+    3600, 7200, 10800, 21600, 43200,
+    86400, 7 * 86400,
+]
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_BUCKET_RE = re.compile(r"^\s*(\d+)\s*([smhdw]?)\s*$")
+
+
+def parse_bucket(text):
+    """'300', '5m', '1h', '1d' -> seconden. Geeft ValueError bij onzin."""
+    m = _BUCKET_RE.match(text or "")
+    if not m or int(m.group(1)) <= 0:
+        raise ValueError(f"ongeldige bucket: {text!r} (gebruik bv. 30s, 5m, 1h, 1d)")
+    return int(m.group(1)) * _UNITS[m.group(2) or "s"]
+
+
+def choose_bucket(start, end, max_points, requested=None):
+    """
+    Kiest de bucketgrootte (seconden): minstens de gevraagde, maar groot
+    genoeg dat er nooit meer dan max_points punten terugkomen.
+    """
+    span = max((end - start).total_seconds(), 1)
+    # max_points - 1: de eerste bucket begint meestal al voor 'start'
+    needed = math.ceil(span / max(max_points - 1, 1))
+    wanted = max(needed, requested or 1)
+    for nice in NICE_BUCKETS:
+        if nice >= wanted:
+            return nice
+    # Nog grover dan een week: in hele dagen
+    return math.ceil(wanted / 86400) * 86400
+
+
+def query_buckets(conn, start, end, bucket_s, max_points, device=None):
+    """
+    Tijd-gebuckete aggregaten, berekend in de database. Geeft (bron, punten)
+    terug; de bron is de grofste rollup die de bucket aankan, anders ruwe data.
+    """
+    g = rollup_for_bucket(bucket_s)
+    if g is not None:
+        rows = query_rollup(conn, g, start, end, bucket_s, max_points, device)
+        return f"rollup_{g}", [_point(row) for row in rows]
+
+    device_filter = "AND device_id = %(device)s" if device else ""
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT date_bin(%(bucket)s, timestamp, TIMESTAMP '2000-01-01') AS t,
+               count(*),
+               min(licht), max(licht), avg(licht),
+               min(bodemvocht), max(bodemvocht), avg(bodemvocht),
+               count(*) FILTER (WHERE water_gegeven)
+        FROM sensor_data
+        WHERE timestamp >= %(start)s AND timestamp < %(end)s
+          {device_filter}
+        GROUP BY 1
+        ORDER BY 1
+        LIMIT %(limit)s
+    ''', {"bucket": timedelta(seconds=bucket_s), "start": start, "end": end,
+          "limit": max_points, "device": device})
+    rows = cur.fetchall()
+    cur.close()
+    return "sensor_data", [_point(row) for row in rows]
+
+
+def _point(row):
+    t, n, l_min, l_max, l_avg, b_min, b_max, b_avg, water = row
+    return {
+        "t": t.isoformat(),
+        "n": n,
+        "licht_min": l_min,
+        "licht_max": l_max,
+        "licht_avg": l_avg,
+        "bodemvocht_min": b_min,
+        "bodemvocht_max": b_max,
+        "bodemvocht_avg": b_avg,
+        "water_gegeven": water,
+    }
+
+
+EXPORT_COLUMNS = ("timestamp", "device_id", "plant_id", "licht", "bodemvocht", "water_gegeven")
+
+
+def _csv_chunk(rows, header=False):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow((row[0].isoformat(),) + row[1:])
+    return buf.getvalue()
+
+
+def _ndjson_chunk(rows):
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, (row[0].isoformat(),) + row[1:]))) + "\n"
+        for row in rows
+    )
+
+
+def query_raw(conn, start, end, device=None, chunk_rows=5000, statement_timeout_ms=300000):
+    """
+    Generator met lijsten ruwe rijen (EXPORT_COLUMNS) uit sensor_data. Leest
+    met een server-side cursor, dus het geheugen blijft gelijk hoe groot het ook is.
+    """
+    device_filter = "AND device_id = %(device)s" if device else ""
+    cur = conn.cursor()
+    # Een export mag langer duren dan een gewone request
+    cur.execute("SET LOCAL statement_timeout = %s", (statement_timeout_ms,))
+    cur.close()
+
+    cur = conn.cursor(name="sensor_export")
+    cur.itersize = chunk_rows
+    cur.execute(f'''
+        SELECT timestamp, device_id, plant_id, licht, bodemvocht, water_gegeven
+        FROM sensor_data
+        WHERE timestamp >= %(start)s AND timestamp < %(end)s
+          {device_filter}
+        ORDER BY timestamp
+    ''', {"start": start, "end": end, "device": device})
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+
+def encode_export(batches, fmt="csv", gzip=False):
+    """Zet lijsten rijen om in stukken CSV of NDJSON (bytes), optioneel als een gzip stroom."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None   # wbits=31: gzip formaat
+
+    def encode(rows, header):
+        text = _csv_chunk(rows, header=header) if fmt == "csv" else _ndjson_chunk(rows)
+        data = text.encode()
+        return compressor.compress(data) if compressor is not None else data
+
+    first = True
+    try:
+        for rows in batches:
+            data = encode(rows, first)
+            first = False
+            if data:
+                yield data
+        if first:
+            # Niets gevonden: alleen de CSV kop
+            yield encode([], True)
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        batches.close()
+
+
+def _in_order(*sources):
+    for source in sources:
+        yield from source
+
+
+def export_chunks(conn, start, end, device=None, fmt="csv", gzip=False,
+                  chunk_rows=5000, statement_timeout_ms=300000, archived=None):
+    """
+    Generator die ruwe metingen in stukken (bytes) oplevert. archived: rijen
+    uit het archief (zie archive.read_archive) die ervoor komen.
+    """
+    batches = query_raw(conn, start, end, device, chunk_rows, statement_timeout_ms)
+    if archived is not None:
+        batches = _in_order(archived, batches)
+    return encode_export(batches, fmt, gzip)
@@ -0,0 +1,107 @@
+"""
+Retentiebeleid voor ruwe metingen.
+
+Per dagpartitie ouder dan SENSOR_RETENTION_DAYS:
+    1. archiveren naar Parquet in ARCHIVE_DIR (als dat gezet is)
+    2. de partitie weggooien
+De rollups (minuut/uur/dag) worden bij elke insert in dezelfde transactie
+bijgewerkt en blijven gewoon staan; ze worden hier niet opnieuw opgebouwd,
+want een partitie kan na een eerdere retentie-ronde opnieuw bestaan met
+alleen een paar late metingen. Zo blijft sensor_data klein (alleen de
+recente dagen) en blijven grafieken over oudere periodes werken via de
+rollups; ruwe oude metingen zijn terug te lezen via /export.
+
+Metingen van voor de retentiegrens weigert de API bij de ingest, zodat een
+weggegooide dag niet opnieuw ontstaat.
+
+Draait periodiek in de API (partitie-onderhoud), of los:
+
+    python retention.py
+"""
+import os
+
+from archive import ARCHIVE_DIR, archive_partition, publish_archive, available as archive_available
+from partitions import SENSOR_RETENTION_DAYS, expired_partitions, drop_partition
+
+# Archiveren van een grote dag mag langer duren dan een gewone query
+RETENTION_STATEMENT_TIMEOUT_MS = int(os.environ.get('RETENTION_STATEMENT_TIMEOUT_MS', '600000'))
+
+# Vaste sleutel zodat maar een worker tegelijk archiveert
+_RETENTION_LOCK_KEY = 7311003
+
+
+def _retire_partition(conn, cur, day, name, archive_dir):
+    """Een transactie per dag: archief en drop horen bij elkaar."""
+    cur.execute("SET LOCAL statement_timeout = %s", (RETENTION_STATEMENT_TIMEOUT_MS,))
+    # Late metingen voor deze dag moeten wachten tot we klaar zijn
+    cur.execute(f"LOCK TABLE {name} IN EXCLUSIVE MODE")
+
+    tmp = archived = None
+    try:
+        if archive_dir:
+            tmp, path, n = archive_partition(conn, name, day, archive_dir)
+        else:
+            cur.execute(f"SELECT count(*) FROM {name}")
+            n = cur.fetchone()[0]
+        drop_partition(cur, day, name)
+        if tmp is not None and n:
+            publish_archive(tmp, path)
+            archived, tmp = path, None
+        conn.commit()
+    except BaseException:
+        if archived:
+            os.remove(archived)
+        raise
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+    return n, archived
+
+
+def apply_retention(conn, retention_days=SENSOR_RETENTION_DAYS, archive_dir=ARCHIVE_DIR, log=print):
+    """Voert het beleid uit voor alle verlopen partities. Geeft [(partitie, rijen, archiefbestand)]."""
+    expired = expired_partitions(conn, retention_days)
+    conn.rollback()
+    if not expired:
+        return []
+    if archive_dir and not archive_available():
+        # Liever niets weggooien dan ongearchiveerd weggooien
+        raise RuntimeError("ARCHIVE_DIR is gezet maar pyarrow is niet geinstalleerd")
+
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (_RETENTION_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        cur.close()
+        conn.rollback()
+        return []
+
+    done = []
+    try:
+        for day, name in expired:
+            n, archived = _retire_partition(conn, cur, day, name, archive_dir)
+            done.append((name, n, archived))
+            log(f"Retentie: {name} ({n} rijen) weg uit sensor_data" + (f", archief {archived}" if archived else ""))
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(%s)", (_RETENTION_LOCK_KEY,))
+        conn.commit()
+        cur.close()
+    return done
+
+
+def main():
+    import psycopg2
+    from database import DATABASE_URL, DB_CONNECT_TIMEOUT
+
+    if not DATABASE_URL:
+        raise SystemExit("DATABASE_URL is niet gezet")
+    conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+    try:
+        done = apply_retention(conn)
+        print(f"{len(done)} partitie(s) verwerkt")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+# Voorgeaggregeerde tabellen per minuut, uur en dag. Ze worden in dezelfde
+# transactie als de insert bijgewerkt, dus ze lopen nooit achter op sensor_data.
+GRANULARITIES = ("minute", "hour", "day")
+GRANULARITY_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Schema zoals migratie 2 het aanmaakt. Niet meer aanpassen: een wijziging
+# gaat in een nieuwe migratie (zie add_value_counts, migratie 3).
+_ROLLUP_DDL = '''
+    CREATE TABLE IF NOT EXISTS sensor_rollup_{g} (
+        device_id TEXT NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        n BIGINT NOT NULL,
+        licht_min FLOAT,
+        licht_max FLOAT,
+        licht_sum FLOAT,
+        bodemvocht_min FLOAT,
+        bodemvocht_max FLOAT,
+        bodemvocht_sum FLOAT,
+        water_count BIGINT NOT NULL,
+        PRIMARY KEY (device_id, bucket)
+    );
+    -- Voor vragen over de hele vloot (zonder device filter)
+    CREATE INDEX IF NOT EXISTS sensor_rollup_{g}_bucket ON sensor_rollup_{g} (bucket);
+'''
+
+# Eerste vulling van een nieuwe tabel in migratie 2 (bevroren, zoals _ROLLUP_DDL)
+_FILL_V2 = '''
+    INSERT INTO sensor_rollup_{g}
+        (device_id, bucket, n, licht_min, licht_max, licht_sum,
+         bodemvocht_min, bodemvocht_max, bodemvocht_sum, water_count)
+    SELECT device_id, date_trunc('{g}', timestamp), count(*),
+           min(licht), max(licht), sum(licht),
+           min(bodemvocht), max(bodemvocht), sum(bodemvocht),
+           count(*) FILTER (WHERE water_gegeven)
+    FROM sensor_data
+    GROUP BY 1, 2
+'''
+
+# Aggregaat van een set ruwe rijen ({src}) naar buckets van granulariteit {g}
+_AGGREGATE = '''
+    SELECT device_id, date_trunc('{g}', timestamp), count(*),
+           min(licht), max(licht), sum(licht), count(licht),
+           min(bodemvocht), max(bodemvocht), sum(bodemvocht), count(bodemvocht),
+           count(*) FILTER (WHERE water_gegeven)
+    FROM {src}
+    GROUP BY 1, 2
+'''
+
+_UPSERT = '''
+    INSERT INTO sensor_rollup_{g} AS r
+        (device_id, bucket, n, licht_min, licht_max, licht_sum, licht_n,
+         bodemvocht_min, bodemvocht_max, bodemvocht_sum, bodemvocht_n, water_count)
+    {aggregate}
+    ON CONFLICT (device_id, bucket) DO UPDATE SET
+        n = r.n + EXCLUDED.n,
+        licht_min = LEAST(r.licht_min, EXCLUDED.licht_min),
+        licht_max = GREATEST(r.licht_max, EXCLUDED.licht_max),
+        licht_sum = COALESCE(r.licht_sum + EXCLUDED.licht_sum, r.licht_sum, EXCLUDED.licht_sum),
+        licht_n = r.licht_n + EXCLUDED.licht_n,
+        bodemvocht_min = LEAST(r.bodemvocht_min, EXCLUDED.bodemvocht_min),
+        bodemvocht_max = GREATEST(r.bodemvocht_max, EXCLUDED.bodemvocht_max),
+        bodemvocht_sum = COALESCE(r.bodemvocht_sum + EXCLUDED.bodemvocht_sum, r.bodemvocht_sum, EXCLUDED.bodemvocht_sum),
+        bodemvocht_n = r.bodemvocht_n + EXCLUDED.bodemvocht_n,
+        water_count = r.water_count + EXCLUDED.water_count
+'''
+
+
+def rollup_ctes(src):
+    """
+    CTE's die de rollups bijwerken met de rijen uit {src} (bv. de RETURNING
+    van de insert). Zo gebeurt insert + rollup in een statement.
+    """
+    return ",\n".join(
+        f"rollup_{g} AS ({_UPSERT.format(g=g, aggregate=_AGGREGATE.format(g=g, src=src))})"
+        for g in GRANULARITIES
+    )
+
+
+def setup_rollups(conn):
+    """Maakt de rollup-tabellen aan; een nieuwe tabel wordt een keer gevuld uit sensor_data."""
+    cur = conn.cursor()
+    for g in GRANULARITIES:
+        cur.execute(
+            "SELECT count(*) FROM information_schema.columns WHERE table_name = %s AND column_name = 'device_id'",
+            (f"sensor_rollup_{g}",)
+        )
+        is_new = cur.fetchone()[0] == 0
+        if is_new:
+            # Nieuw, of nog van voor device_id: opnieuw opbouwen uit de ruwe data
+            cur.execute(f"DROP TABLE IF EXISTS sensor_rollup_{g}")
+        cur.execute(_ROLLUP_DDL.format(g=g))
+        if is_new:
+            cur.execute(_FILL_V2.format(g=g))
+    conn.commit()
+    cur.close()
+
+
+def add_value_counts(conn):
+    """
+    Migratie 3: licht_n/bodemvocht_n, zodat een meting zonder licht niet
+    meetelt in het gemiddelde. Bestaande buckets hadden steeds alle
+    waarden, of (licht_sum leeg) geen enkele.
+    """
+    cur = conn.cursor()
+    for g in GRANULARITIES:
+        for col in ("licht", "bodemvocht"):
+            cur.execute(f"ALTER TABLE sensor_rollup_{g} ADD COLUMN IF NOT EXISTS {col}_n BIGINT")
+            cur.execute(f"UPDATE sensor_rollup_{g} SET {col}_n = CASE WHEN {col}_sum IS NULL THEN 0 ELSE n END "
+                        f"WHERE {col}_n IS NULL")
+            cur.execute(f"ALTER TABLE sensor_rollup_{g} ALTER COLUMN {col}_n SET DEFAULT 0, "
+                        f"ALTER COLUMN {col}_n SET NOT NULL")
+    conn.commit()
+    cur.close()
+
+
+def rollup_for_bucket(bucket_s):
+    """De grofste rollup waarvan de buckets precies in bucket_s passen (of None)."""
+    for g in reversed(GRANULARITIES):
+        if bucket_s % GRANULARITY_SECONDS[g] == 0:
+            return g
+    return None
+
+
+def query_rollup(conn, g, start, end, bucket_s, max_points, device=None):
+    """Zelfde punten als readings.query_buckets, maar uit sensor_rollup_{g}."""
+    device_filter = "AND device_id = %(device)s" if device else ""
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT date_bin(%(bucket)s, bucket, TIMESTAMP '2000-01-01') AS t,
+               sum(n)::bigint,
+               min(licht_min), max(licht_max), sum(licht_sum) / NULLIF(sum(licht_n), 0),
+               min(bodemvocht_min), max(bodemvocht_max), sum(bodemvocht_sum) / NULLIF(sum(bodemvocht_n), 0),
+               sum(water_count)::bigint
+        FROM sensor_rollup_{g}
+        WHERE bucket >= date_trunc('{g}', %(start)s::timestamp) AND bucket < %(end)s
+          {device_filter}
+        GROUP BY 1
+        ORDER BY 1
+        LIMIT %(limit)s
+    ''', {"bucket": timedelta(seconds=bucket_s), "start": start, "end": end,
+          "limit": max_points, "device": device})
+    rows = cur.fetchall()
+    cur.close()
+    return rows
@@ -0,0 +1,79 @@
+"""
+Offline wachtrij op de Pi (SQLite in WAL modus).
+
+Metingen die niet verstuurd konden worden, worden hier bewaard tot de API
+weer bereikbaar is, ook als de Pi tussendoor herstart. Zuinig voor de
+SD-kaart: alleen schrijven als het netwerk weg is, een transactie per
+batch, WAL met synchronous=NORMAL (geen fsync per commit) en nooit VACUUM.
+"""
+import sqlite3
+
+SPOOL_MAX_ROWS = 500000     # ~25 MB; bij 1 meting per 5 s ruim 4 weken offline
+
+
+class Spool:
+    def __init__(self, path, max_rows=SPOOL_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        # Alleen de uplink-thread gebruikt de verbinding, maar die wordt elders aangemaakt
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp INTEGER NOT NULL,
+                seq INTEGER,
+                licht REAL,
+                bodemvocht REAL,
+                water_gegeven INTEGER NOT NULL
+            )
+        ''')
+        self.dropped = 0
+        self.pending = self._count()
+
+    def _count(self):
+        # Er wordt alleen vooraan verwijderd, dus de ids zijn aaneengesloten
+        lo, hi = self._db.execute("SELECT min(id), max(id) FROM spool").fetchone()
+        return 0 if lo is None else hi - lo + 1
+
+    def append(self, readings):
+        """Bewaart een batch metingen (een transactie); boven max_rows gaat de oudste weg."""
+        if not readings:
+            return
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                "INSERT INTO spool (timestamp, seq, licht, bodemvocht, water_gegeven) VALUES (?, ?, ?, ?, ?)",
+                [(r["timestamp"], r["seq"], r["licht"], r["bodemvocht"], int(r["water_gegeven"])) for r in readings]
+            )
+            cur = self._db.execute(
+                "DELETE FROM spool WHERE id <= (SELECT max(id) FROM spool) - ?", (self.max_rows,)
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self.dropped += max(cur.rowcount, 0)
+        self.pending = self._count()
+
+    def peek(self, n):
+        """De oudste n metingen als (laatste id, [metingen]); (None, []) als de spool leeg is."""
+        rows = self._db.execute(
+            "SELECT id, timestamp, seq, licht, bodemvocht, water_gegeven FROM spool ORDER BY id LIMIT ?", (n,)
+        ).fetchall()
+        if not rows:
+            return None, []
+        readings = [
+            {"timestamp": ts, "seq": seq, "licht": licht, "bodemvocht": vocht, "water_gegeven": bool(water)}
+            for _id, ts, seq, licht, vocht, water in rows
+        ]
+        return rows[-1][0], readings
+
+    def remove_upto(self, last_id):
+        """Verstuurd: alles tot en met last_id weg."""
+        self._db.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+        self.pending = self._count()
+
+    def close(self):
+        self._db.close()
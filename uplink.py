@@ -0,0 +1,609 @@
+"""
+Uplink van de Pi naar de API, op de achtergrond.
+
+UI- en sensorcode roepen alleen send() aan: de meting gaat in een begrensde
+wachtrij en send() komt meteen terug, ook als de API traag is of net
+opstart. Een eigen thread verstuurt de wachtrij in batches naar
+/log_data/batch en probeert het later opnieuw als dat mislukt.
+
+Met spool_path worden metingen die niet weg konden op schijf bewaard
+(spool.py) en later in grote batches nagestuurd, begrensd op
+replay_rate metingen per seconde zodat de API niet overspoeld wordt.
+
+Alle requests gaan over een blijvende sessie (keep-alive), zodat niet elke
+meting een nieuwe TCP+TLS handshake kost. Een verbinding die lang stil lag
+wordt pas bij de volgende verzending eerst met een GET /ready gecontroleerd
+(geen timer: een stille Pi maakt geen verkeer); snapshot() laat de latency
+zien voor nieuwe en hergebruikte verbindingen.
+
+Na een mislukte poging wacht de uplink steeds langer (exponentieel, met
+jitter). Na breaker_threshold fouten op rij gaat de circuit breaker open:
+dan wordt er helemaal niets meer geprobeerd en gaan metingen direct naar de
+wachtrij/spool. Na de wachttijd is de eerstvolgende echte verzending de
+proef: alleen een 2xx sluit de breaker (een /ready die antwoordt terwijl de
+ingest 5xx geeft telt niet). on_breaker(state) meldt elke toestandswissel.
+
+Een onverwachte fout in de thread wordt gelogd en geteld (loop_errors),
+waarna de uplink kort pauzeert en gewoon doorgaat. Werkt de spool niet meer
+(SD-kaart vol of kapot), dan gaat de uplink verder met alleen het geheugen.
+
+    uplink = Uplink("https://smartworld-nbyf.onrender.com", device_id="pi-keuken",
+                    spool_path="/home/pi/uplink_spool.db")
+    uplink.start()
+    uplink.send(licht=r, bodemvocht=p, water_gegeven=False)
+"""
+import gzip
+import itertools
+import json
+import random
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from reading_codec import encode_readings, CONTENT_TYPE as READING_CONTENT_TYPE
+from spool import Spool, SPOOL_MAX_ROWS
+
+UPLINK_MAX_QUEUE = 1000     # metingen; daarna valt de oudste weg
+UPLINK_BATCH_MAX = 100      # metingen per request
+UPLINK_TIMEOUT = 5          # sec per request
+UPLINK_RETRY_S = 5          # eerste wachttijd na een mislukte poging, daarna steeds x2
+UPLINK_RETRY_MAX_S = 120    # langste wachttijd zolang de breaker dicht is
+BREAKER_THRESHOLD = 5       # zoveel fouten op rij: breaker open
+BREAKER_OPEN_S = 60         # eerste probe na zoveel sec, daarna steeds x2
+BREAKER_MAX_OPEN_S = 900    # langste tijd tussen twee probes
+SPOOL_FLUSH_S = 60          # breaker open: wachtrij zo vaak naar de spool schrijven
+REPLAY_BATCH = 2000         # metingen per request bij het nasturen uit de spool
+REPLAY_RATE = 2000          # metingen per seconde: een dag offline is zo in ~10 s weg
+UPLINK_HEALTH_S = 30        # zo lang stil: voor de volgende verzending eerst controleren (0 = nooit)
+UPLINK_GZIP_MIN = 1024      # bodies vanaf zoveel bytes gzippen (als compress aan staat)
+UPLINK_ERROR_PAUSE_S = 1    # pauze na een onverwachte fout in de uplink-thread
+
+# Een meting die niet te coderen is (bv. een waarde die niet in het frame past)
+ENCODE_ERRORS = (struct.error, ValueError, TypeError, OverflowError)
+
+
+def default_device_id():
+    """
+    Vaste, unieke id voor dit apparaat: het serienummer van de Pi uit
+    /proc/cpuinfo, anders /etc/machine-id. De hostname alleen als laatste
+    uitweg; op een standaard Pi is die overal "raspberrypi".
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("Serial"):
+                    serial = line.split(":", 1)[1].strip().lstrip("0")
+                    if serial:
+                        return f"pi-{serial}"
+    except OSError:
+        pass
+    try:
+        with open("/etc/machine-id") as f:
+            machine_id = f.read().strip()
+        if machine_id:
+            return f"machine-{machine_id}"
+    except OSError:
+        pass
+    hostname = socket.gethostname()
+    print(f"Geen serienummer of machine-id gevonden, device_id = hostname ({hostname})")
+    return hostname
+
+
+class LatencyStats:
+    """Laatste N request-tijden, apart voor nieuwe en hergebruikte verbindingen."""
+
+    def __init__(self, keep=200):
+        self._samples = {"new": deque(maxlen=keep), "reused": deque(maxlen=keep), "health": deque(maxlen=keep)}
+
+    def observe(self, kind, seconds):
+        self._samples[kind].append(seconds)
+
+    def snapshot(self):
+        result = {}
+        for kind, samples in self._samples.items():
+            values = sorted(samples)
+            if not values:
+                continue
+            result[kind] = {
+                "n": len(values),
+                "p50_ms": round(values[len(values) // 2] * 1000, 1),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+            }
+        return result
+
+
+class CircuitBreaker:
+    """
+    closed: versturen mag, na een fout eerst een exponentiele backoff.
+    open: na threshold fouten op rij; niets proberen tot de probe-tijd.
+    half_open: een echte verzending is de proef; gelukt (2xx) -> closed,
+    mislukt -> weer open (langer). Pas een gelukte verzending zet de
+    backoff terug.
+    Alle wachttijden krijgen jitter, zodat niet alle Pi's tegelijk aankloppen
+    als de API terugkomt.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, retry_s=UPLINK_RETRY_S, retry_max_s=UPLINK_RETRY_MAX_S,
+                 open_s=BREAKER_OPEN_S, max_open_s=BREAKER_MAX_OPEN_S):
+        self.threshold = threshold
+        self.retry_s = retry_s
+        self.retry_max_s = retry_max_s
+        self.open_s = open_s
+        self.max_open_s = max_open_s
+        self.state = "closed"
+        self.failures = 0           # fouten op rij
+        self.opened = 0             # keer open gegaan (totaal)
+        self._open_streak = 0       # probes op rij mislukt
+        self._next_attempt = 0.0
+
+    @staticmethod
+    def _jitter(delay):
+        # "Equal jitter": minstens de helft, zodat de backoff echt oploopt
+        return random.uniform(delay / 2, delay)
+
+    def wait(self, now=None):
+        """Seconden tot er weer iets geprobeerd mag worden (0 = nu)."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._next_attempt - now)
+
+    def half_open(self):
+        self.state = "half_open"
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._open_streak = 0
+        self._next_attempt = 0.0
+
+    def failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state == "closed":
+                self.opened += 1
+            self.state = "open"
+            delay = min(self.max_open_s, self.open_s * 2 ** self._open_streak)
+            self._open_streak += 1
+        else:
+            delay = min(self.retry_max_s, self.retry_s * 2 ** (self.failures - 1))
+        self._next_attempt = now + self._jitter(delay)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "retry_in_s": round(self.wait(), 1),
+        }
+
+
+class Uplink:
+    def __init__(self, base_url, device_id=None, plant_id=None, binary=True,
+                 max_queue=UPLINK_MAX_QUEUE, batch_max=UPLINK_BATCH_MAX,
+                 timeout=UPLINK_TIMEOUT, retry_s=UPLINK_RETRY_S,
+                 spool_path=None, spool_max_rows=SPOOL_MAX_ROWS,
+                 replay_batch=REPLAY_BATCH, replay_rate=REPLAY_RATE,
+                 compress=False, health_s=UPLINK_HEALTH_S,
+                 retry_max_s=UPLINK_RETRY_MAX_S, breaker_threshold=BREAKER_THRESHOLD,
+                 breaker_open_s=BREAKER_OPEN_S, breaker_max_open_s=BREAKER_MAX_OPEN_S,
+                 on_breaker=None):
+        self.url = base_url.rstrip("/") + "/log_data/batch"
+        self.health_url = base_url.rstrip("/") + "/ready"
+        self.device_id = device_id or default_device_id()
+        self.plant_id = plant_id
+        self.binary = binary
+        self.max_queue = max_queue
+        self.batch_max = batch_max
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(breaker_threshold, retry_s, retry_max_s,
+                                      breaker_open_s, breaker_max_open_s)
+        self.on_breaker = on_breaker
+        self._breaker_seen = self.breaker.state
+        self.replay_batch = replay_batch
+        self.replay_rate = replay_rate
+        self.compress = compress
+        self.health_s = health_s
+        self._session = None
+        self._adapter = None
+        self._last_activity = time.monotonic()
+        # Zonder spool blijft alles in het geheugen (weg bij een herstart)
+        self.spool = Spool(spool_path, spool_max_rows) if spool_path else None
+        self._next_replay = 0.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._final_attempt = False     # na stop() nog een verzendpoging gedaan
+        self._reused = False            # laatste request ging over een bestaande verbinding
+        self._thread = None
+        # Volgnummer per meting, zodat de API een herhaalde meting herkent. Start bij
+        # de huidige tijd, dan hergebruikt een herstart geen oude nummers.
+        self._seq = itertools.count(int(time.time()))
+
+        self.sent = 0
+        self.replayed = 0
+        self.dropped = 0        # wachtrij vol: oudste weggegooid
+        self.rejected = 0       # door de API geweigerd (4xx), niet opnieuw
+        self.failures = 0
+        self.loop_errors = 0    # onverwachte fouten in de uplink-thread
+        self.last_error = None
+        self.last_success = None
+        self.healthy = None
+        self.connections = 0    # nieuwe verbindingen (handshakes)
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.latency = LatencyStats()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="uplink", daemon=True)
+            self._thread.start()
+
+    def send(self, licht, bodemvocht, water_gegeven=False, timestamp=None):
+        """Zet een meting in de wachtrij. Blokkeert nooit op het netwerk."""
+        reading = {
+            "timestamp": int(timestamp if timestamp is not None else time.time()),
+            "seq": next(self._seq) & 0xFFFFFFFF,
+            "licht": licht,
+            "bodemvocht": bodemvocht,
+            "water_gegeven": bool(water_gegeven),
+        }
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(reading)
+            self._cond.notify()
+
+    def stop(self, timeout=None):
+        """
+        Doet nog een verzendpoging; wat niet weg kan gaat in de spool. Wacht
+        standaard het slechtste geval af: de lopende verzending, de laatste
+        poging en het wegschrijven.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(2 * self._max_delivery_s() + 1 if timeout is None else timeout)
+            if self._thread.is_alive():
+                print(f"Uplink niet op tijd gestopt: {self.pending} metingen nog niet weggeschreven")
+
+    def _max_delivery_s(self):
+        # Langste verzending: health check, request en een herhaling na een gevallen keep-alive verbinding
+        return (3 if self.health_s else 2) * self.timeout
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def snapshot(self):
+        spool = self.spool
+        return {
+            "pending": self.pending,
+            "spooled": spool.pending if spool else 0,
+            "sent": self.sent,
+            "replayed": self.replayed,
+            "dropped": self.dropped + (spool.dropped if spool else 0),
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "loop_errors": self.loop_errors,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+            "healthy": self.healthy,
+            "connections": self.connections,
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+            "latency": self.latency.snapshot(),
+            "breaker": self.breaker.snapshot(),
+        }
+
+    def _take_batch(self, timeout):
+        """Nieuwe metingen; [] na timeout, None als we stoppen en alles weg is."""
+        with self._cond:
+            if not self._queue and not self._stopping:
+                self._cond.wait(timeout)
+            batch = []
+            while self._queue and len(batch) < self.batch_max:
+                batch.append(self._queue.popleft())
+            if not batch and self._stopping:
+                return None
+            return batch
+
+    def _put_back(self, batch):
+        # Vooraan terug, zodat de volgorde klopt; past het niet, dan gaat de oudste weg
+        with self._cond:
+            for reading in reversed(batch):
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    continue
+                self._queue.appendleft(reading)
+
+    def _park(self, batch):
+        """
+        Niet verstuurd: naar de spool als die er is (samen met alles wat al
+        in het geheugen wacht, in een transactie), anders terug in het geheugen.
+        """
+        if self.spool is None:
+            self._put_back(batch)
+            return
+        with self._cond:
+            batch = batch + list(self._queue)
+            self._queue.clear()
+        try:
+            self.spool.append(batch)
+        except sqlite3.Error as e:
+            self._drop_spool(e)
+            self._put_back(batch)
+
+    def _drop_spool(self, error):
+        """Spool werkt niet meer: verder alleen in het geheugen (weg bij een herstart)."""
+        spool, self.spool = self.spool, None
+        print(f"Spool {spool.path} werkt niet meer ({error}), verder zonder spool")
+        self.dropped += spool.dropped
+        try:
+            spool.close()
+        except sqlite3.Error:
+            pass
+
+    def _pause(self, seconds):
+        with self._cond:
+            self._cond.wait_for(lambda: self._stopping, seconds)
+
+    def _replay_wait(self):
+        # Tijd tot het volgende stuk spool (None = niets na te sturen)
+        if self.spool is None or not self.spool.pending:
+            return None
+        return max(0.0, self._next_replay - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                if not self._step():
+                    break
+            except Exception as e:
+                # De thread mag nooit stil stoppen: loggen, tellen, even wachten, door
+                self.loop_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Uplink: onverwachte fout ({self.last_error})")
+                if isinstance(e, sqlite3.Error) and self.spool is not None:
+                    self._drop_spool(e)
+                if self._stopping:
+                    break
+                self._pause(UPLINK_ERROR_PAUSE_S)
+        with self._cond:
+            rest = list(self._queue)
+            self._queue.clear()
+        if self.spool is not None:
+            try:
+                self.spool.append(rest)
+                self.spool.close()
+            except sqlite3.Error as e:
+                print(f"Spool niet bijgewerkt bij afsluiten: {len(rest)} metingen verloren ({e})")
+        if self._session is not None:
+            self._session.close()
+
+    def _step(self):
+        """Een ronde van de uplink-thread; False als we stoppen."""
+        blocked = self.breaker.wait()
+        if blocked:
+            # Backoff of breaker open: niets proberen, metingen blijven liggen
+            if self._stopping:
+                return False
+            self._pause(min(blocked, SPOOL_FLUSH_S))
+            if self.spool is not None and self.pending:
+                self._park([])
+            return True
+        if self.breaker.state == "open":
+            # Wachttijd om: de volgende verzending (nieuw of uit de spool) is de proef
+            if self._stopping:
+                return False
+            self.breaker.half_open()
+            self._breaker_changed()
+        batch = self._take_batch(self._replay_wait())
+        if batch is None:
+            return False    # gestopt en niets meer te versturen
+        if batch:
+            if self._stopping:
+                if self._final_attempt:
+                    # Een laatste poging is genoeg: de rest direct naar de spool
+                    self._park(batch)
+                    return False
+                self._final_attempt = True
+            # Nieuwe metingen gaan voor, de spool komt daarna
+            result = self._deliver(batch)
+            if result == "ok":
+                self.sent += len(batch)
+            elif result == "retry":
+                self._park(batch)
+                if self._stopping:
+                    return False
+        elif self._replay_wait() == 0:
+            self._replay()
+        return True
+
+    def _replay(self):
+        last_id, readings = self.spool.peek(self.replay_batch)
+        if not readings:
+            return
+        result = self._deliver(readings)
+        if result == "retry":
+            return
+        # Ook bij "rejected": opnieuw sturen helpt niet
+        self.spool.remove_upto(last_id)
+        if result == "ok":
+            self.replayed += len(readings)
+        self._next_replay = time.monotonic() + len(readings) / self.replay_rate
+
+    def _succeeded(self):
+        self.healthy = True
+        self.breaker.success()
+        self._breaker_changed()
+
+    def _failed(self, error):
+        self.failures += 1
+        self.healthy = False
+        self.last_error = error
+        self.breaker.failure()
+        self._breaker_changed()
+
+    def _breaker_changed(self):
+        state = self.breaker.state
+        if state == self._breaker_seen:
+            return
+        self._breaker_seen = state
+        if self.on_breaker is not None:
+            try:
+                self.on_breaker(state)
+            except Exception as e:
+                print(f"on_breaker mislukt: {e}")
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            # Een Pi praat met een server: een verbinding is genoeg, herhalen doen we zelf
+            self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+            self._session.mount(self.url, self._adapter)
+            self._session.mount(self.health_url, self._adapter)
+        return self._session
+
+    def _opened_connections(self):
+        # Totaal aantal ooit geopende verbindingen (urllib3 telt per pool)
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def _reset_session(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _request(self, method, url, **kwargs):
+        """Request over de blijvende sessie; meet de latency en of er een nieuwe verbinding nodig was."""
+        session = self._get_session()
+        before = self._opened_connections()
+        t0 = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=self.timeout, **kwargs)
+        finally:
+            new = self._opened_connections() - before
+            self._reused = not new
+            self.connections += new
+        elapsed = time.perf_counter() - t0
+        self._last_activity = time.monotonic()
+        return response, elapsed, bool(new)
+
+    def _health_check(self):
+        """
+        GET /ready; True als de verbinding werkt. Ook een 503 (API warmt nog
+        op) telt als werkende verbinding, maar niet als succes voor de
+        breaker: dat is alleen een gelukte verzending.
+        """
+        try:
+            _response, elapsed, _new = self._request("GET", self.health_url)
+        except requests.RequestException as e:
+            self._reset_session()
+            self._last_activity = time.monotonic()
+            self._failed(str(e))
+            return False
+        self.latency.observe("health", elapsed)
+        return True
+
+    def _idle_check(self):
+        # Alleen een verbinding die langer dan health_s stil lag eerst controleren;
+        # half open is de verzending zelf de proef
+        if not self.health_s or self._session is None or self.breaker.state == "half_open":
+            return True
+        if time.monotonic() - self._last_activity < self.health_s:
+            return True
+        return self._health_check()
+
+    def _deliver(self, batch):
+        """Verstuurt een batch: "ok", "rejected" (4xx, niet opnieuw) of "retry"."""
+        encoded = self._encode(batch)
+        if encoded is None:
+            return "rejected"
+        if not self._idle_check():
+            return "retry"
+        try:
+            try:
+                status = self._post(*encoded)
+            except requests.ConnectionError as e:
+                # Alleen een keep-alive verbinding die de server al had gesloten: meteen een
+                # keer opnieuw met een verse verbinding (seq voorkomt dubbele). Een nieuwe
+                # verbinding die niet opkomt (offline) niet: dat kost alleen tijd en radio.
+                if isinstance(e, requests.ConnectTimeout) or not self._reused:
+                    raise
+                self._reset_session()
+                status = self._post(*encoded)
+        except requests.RequestException as e:
+            self._reset_session()
+            self._failed(str(e))
+            return "retry"
+
+        if 200 <= status < 300:
+            self._succeeded()
+            self.last_success = time.time()
+            return "ok"
+        if 400 <= status < 500 and status not in (408, 429):
+            # Opnieuw sturen helpt niet (kapotte meting); wel tellen. Geen succes voor de
+            # breaker: het zegt niets over de ingest.
+            self.healthy = True
+            self.last_error = f"HTTP {status}"
+            self.rejected += len(batch)
+            return "rejected"
+        self._failed(f"HTTP {status}")
+        return "retry"
+
+    def _body(self, batch):
+        if self.binary:
+            body = encode_readings(batch, device_id=self.device_id, plant_id=self.plant_id)
+            return body, {"Content-Type": READING_CONTENT_TYPE}
+        rows = [
+            dict(r, timestamp=datetime.fromtimestamp(r["timestamp"]).astimezone().isoformat(),
+                 device_id=self.device_id, plant_id=self.plant_id)
+            for r in batch
+        ]
+        return json.dumps(rows, allow_nan=False).encode(), {"Content-Type": "application/json"}
+
+    def _encode(self, batch):
+        """
+        (body, headers) voor de batch. Metingen die niet te coderen zijn gaan
+        eruit en tellen als rejected (opnieuw proberen helpt niet); None als
+        er niets overblijft.
+        """
+        try:
+            return self._wire(*self._body(batch))
+        except ENCODE_ERRORS:
+            pass
+        good = []
+        for reading in batch:
+            try:
+                self._body([reading])
+            except ENCODE_ERRORS as e:
+                self.rejected += 1
+                self.last_error = f"meting niet te versturen: {e}"
+                print(f"Uplink: meting overgeslagen, {self.last_error}: {reading}")
+            else:
+                good.append(reading)
+        return self._wire(*self._body(good)) if good else None
+
+    def _wire(self, body, headers):
+        # Een keer per batch comprimeren en tellen, ook als hij daarna herhaald wordt
+        self.bytes_raw += len(body)
+        if self.compress and len(body) >= UPLINK_GZIP_MIN:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _post(self, body, headers):
+        self.bytes_sent += len(body)
+        response, elapsed, new = self._request("POST", self.url, data=body, headers=headers)
+        self.latency.observe("new" if new else "reused", elapsed)
+        return response.status_code